@@ -5,13 +5,37 @@ import sys
 
 from dotenv import load_dotenv
 
-from .database.db_backup import dump_db, load_db_dump
-from .database.db_setup import create_db
-from .dataset.lyrics_getter import connect_to_api, run_lyrics_getter
+from .database.db_backup import (
+    backup_db,
+    dump_db,
+    dump_db_delta,
+    load_db_dump,
+    restore_db,
+    track_changes,
+)
+from .database.db_setup import create_db, migrate_db
+from .database.query_audit import audit_queries
+from .dataset.lyrics_getter import (
+    connect_to_api,
+    migrate_lyrics_to_corpus,
+    run_lyrics_getter,
+)
 from .dataset.lyrics_values import run_lyrics_scorer
 from .dataset.preprocessing import filter_tracks
-from .dataset.spotify_ds_reader import read_artists_csv, read_tracks_csv
+from .dataset.spotify_ds_reader import (
+    read_artists_csv,
+    read_artists_csv_bulk,
+    read_artists_csv_parallel,
+    read_artists_csv_vectorized,
+    read_tracks_csv,
+    read_tracks_csv_bulk,
+    read_tracks_csv_parallel,
+    read_tracks_csv_vectorized,
+)
 from .logging_config import LOGGING_CONFIG
+from .training.batch_scoring import predict
+from .training.prediction_server import serve_predictions
+from .training.grid_training import train_grid, train_model
 from .training.music_features import train
 
 # from .training.artist_features import train_artists
@@ -53,20 +77,84 @@ def main():
         log.info("Calling script 'connect_to_api'")
         connect_to_api()
     elif script == "run_lyrics_getter":
-        log.info("Calling script 'run_lyrics_getter'")
-        run_lyrics_getter()
+        log.info(f"Calling script 'run_lyrics_getter' with arguments {args}")
+        # optional arguments: workers, limit, rate, flush_every, flush_interval
+        arg_types = [int, int, float, int, float]
+        run_lyrics_getter(*[t(a) for t, a in zip(arg_types, args)])
+    elif script == "migrate_lyrics_to_corpus":
+        log.info("Calling script 'migrate_lyrics_to_corpus'")
+        migrate_lyrics_to_corpus()
     elif script == "read_artists_csv":
         log.info(f"Calling script 'read_artists_csv' with argument '{args[0]}'")
         read_artists_csv(str(args[0]))
+    elif script == "read_artists_csv_bulk":
+        log.info(f"Calling script 'read_artists_csv_bulk' with arguments {args}")
+        if len(args) > 1:
+            read_artists_csv_bulk(str(args[0]), chunk_size=int(args[1]))
+        else:
+            read_artists_csv_bulk(str(args[0]))
     elif script == "read_tracks_csv":
         log.info(f"Calling script 'read_tracks_csv' with argument '{args[0]}'")
         read_tracks_csv(str(args[0]))
+    elif script == "read_tracks_csv_bulk":
+        log.info(f"Calling script 'read_tracks_csv_bulk' with arguments {args}")
+        if len(args) > 1:
+            read_tracks_csv_bulk(str(args[0]), chunk_size=int(args[1]))
+        else:
+            read_tracks_csv_bulk(str(args[0]))
+    elif script == "read_tracks_csv_vectorized":
+        log.info(f"Calling script 'read_tracks_csv_vectorized' with arguments {args}")
+        if len(args) > 1:
+            read_tracks_csv_vectorized(str(args[0]), chunk_size=int(args[1]))
+        else:
+            read_tracks_csv_vectorized(str(args[0]))
+    elif script == "read_artists_csv_vectorized":
+        log.info(f"Calling script 'read_artists_csv_vectorized' with arguments {args}")
+        if len(args) > 1:
+            read_artists_csv_vectorized(str(args[0]), chunk_size=int(args[1]))
+        else:
+            read_artists_csv_vectorized(str(args[0]))
+    elif script == "read_tracks_csv_parallel":
+        log.info(f"Calling script 'read_tracks_csv_parallel' with arguments {args}")
+        # optional arguments: workers, chunk_bytes, max_pending
+        read_tracks_csv_parallel(str(args[0]), *[int(a) for a in args[1:4]])
+    elif script == "read_artists_csv_parallel":
+        log.info(f"Calling script 'read_artists_csv_parallel' with arguments {args}")
+        # optional arguments: workers, chunk_bytes, max_pending
+        read_artists_csv_parallel(str(args[0]), *[int(a) for a in args[1:4]])
     elif script == "dump_db":
         if len(args) != 0:
-            log.info(f"Calling script 'dump_db' with argument '{args[0]}'")
-            dump_db(str(args[0]))
+            log.info(f"Calling script 'dump_db' with arguments {args}")
+            # optional argument: compression
+            dump_db(*args[:2])
         else:
             log.critical("No arguments specified for script 'dump_db'")
+    elif script == "track_changes":
+        if len(args) != 0:
+            log.info(f"Calling script 'track_changes' with argument '{args[0]}'")
+            track_changes(str(args[0]))
+        else:
+            log.critical("No arguments specified for script 'track_changes'")
+    elif script == "dump_db_delta":
+        if len(args) != 0:
+            log.info(f"Calling script 'dump_db_delta' with arguments {args}")
+            # optional argument: compression
+            dump_db_delta(*args[:2])
+        else:
+            log.critical("No arguments specified for script 'dump_db_delta'")
+    elif script == "backup_db":
+        if len(args) != 0:
+            log.info(f"Calling script 'backup_db' with arguments {args}")
+            # optional argument: compression
+            backup_db(*args[:2])
+        else:
+            log.critical("No arguments specified for script 'backup_db'")
+    elif script == "restore_db":
+        if len(args) != 0:
+            log.info(f"Calling script 'restore_db' with argument '{args[0]}'")
+            restore_db(str(args[0]))
+        else:
+            log.critical("No arguments specified for script 'restore_db'")
     elif script == "load_db_dump":
         if len(args) != 0:
             log.info(f"Calling script 'load_db' with argument '{args[0]}'")
@@ -79,15 +167,67 @@ def main():
             create_db(str(args[0]))
         else:
             log.critical("No arguments specified for script 'create_db'")
+    elif script == "migrate_db":
+        if len(args) != 0:
+            log.info(f"Calling script 'migrate_db' with argument '{args[0]}'")
+            migrate_db(str(args[0]))
+        else:
+            log.critical("No arguments specified for script 'migrate_db'")
+    elif script == "audit_queries":
+        log.info(f"Calling script 'audit_queries' with arguments {args}")
+        if audit_queries(*args[:1]) > 0:
+            exit(1)
     elif script == "filter_tracks":
         log.info(f"Calling script 'filter_tracks'")
-        filter_tracks()
+        if len(args) != 0:
+            filter_tracks(workers=int(args[0]))
+        else:
+            filter_tracks()
     elif script == "train_music":
         log.info(f"Calling script 'train'")
         train()
+    elif script == "train_grid":
+        log.info(f"Calling script 'train_grid' with arguments {args}")
+        # optional arguments: n_jobs, folds
+        train_grid(*[int(a) for a in args[:2]])
+    elif script == "train_model":
+        if len(args) != 0:
+            log.info(f"Calling script 'train_model' with arguments {args}")
+            # optional arguments: feature_set, label_scheme, name, model_type
+            train_model(*args[:5])
+        else:
+            log.critical("No model specified for script 'train_model'")
+    elif script == "predict":
+        if len(args) > 1:
+            log.info(f"Calling script 'predict' with arguments {args}")
+            # optional arguments: db_name, chunk_size, csv_path
+            arg_types = [str, str, str, int, str]
+            predict(*[t(a) for t, a in zip(arg_types, args)])
+        else:
+            log.critical("No model name and model type specified for script 'predict'")
+    elif script == "serve_predictions":
+        if len(args) != 0:
+            log.info(f"Calling script 'serve_predictions' with arguments {args}")
+            # models as comma separated model_type/model_name
+            models = [tuple(m.split("/")[::-1]) for m in args[0].split(",")]
+            # optional arguments: port, max_batch, max_wait in milliseconds
+            options = [t(a) for t, a in zip([int, int, float], args[1:4])]
+            if len(options) > 2:
+                options[2] /= 1000
+            serve_predictions(models, *options)
+        else:
+            log.critical("No models specified for script 'serve_predictions'")
     elif script == "run_lyrics_scorer":
-        log.info("Calling script 'run_lyrics_scorer'.")
-        run_lyrics_scorer()
+        log.info(f"Calling script 'run_lyrics_scorer' with arguments {args}.")
+        # optional arguments: workers, chunk_size
+        run_lyrics_scorer(*[int(a) for a in args[:2]])
+    elif script == "benchmark":
+        log.info(f"Calling script 'benchmark' with arguments {args}")
+        # benchmarks import every module and their test dependencies
+        from .benchmarks import run_benchmarks
+
+        if run_benchmarks(args) > 0:
+            exit(1)
     # elif script == "train_artists":
     #     log.info("Calling script 'train_artists'.")
     #     train_artists()
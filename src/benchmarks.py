@@ -0,0 +1,479 @@
+import csv
+import logging
+import math
+import random
+import sqlite3
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import confusion_matrix
+
+# db_interface has to be imported before preprocessing due to circular imports
+from .database import db_interface as db
+from .database.db_setup import TABLES
+from .dataset.preprocessing import (
+    filter_similar_song_names,
+    filter_similar_song_names_naive,
+    process_track_row,
+    process_tracks_frame,
+)
+from .dataset.spotify_ds_reader import (
+    TRACKS_TEXT_COLUMNS,
+    frame_to_rows,
+    read_csv_chunks,
+    read_csv_frames,
+)
+from .dataset import lyrics_getter
+from .dataset.lyrics_fetcher import fetch_lyrics_concurrently
+from .dataset.lyrics_values import score_lyrics
+from .training import pre_training as t
+from .training.postprocessing import ModelEvaluation
+
+log = logging.getLogger("main")
+
+
+class BenchmarkMismatch(Exception):
+    """Raised when an implementation returns other results than its reference."""
+
+
+WORDS = ["love", "night", "fire", "heart", "dance", "rain", "gold", "city", "dream"]
+SUFFIXES = [" - Remix", " - Live", " (feat. Someone)", " - Radio Edit", " Pt. 2"]
+
+
+def synthetic_artist_tracks(n_tracks: int, seed: int = 42) -> List[List]:
+    """Generates track rows of a synthetic artist in the format of the tracks table,
+    ordered by name length like in filter_tracks.
+
+    Args:
+        n_tracks (int): number of tracks of the artist
+        seed (int, optional): seed for the random generator. Defaults to 42.
+
+    Returns:
+        List[List]: list of (id, name, popularity) rows
+    """
+    rng = random.Random(seed)
+    names = []
+
+    while len(names) < n_tracks:
+        name = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+        names.append(name)
+
+        # some songs are released again as remix, live version, ...
+        for suffix in rng.sample(SUFFIXES, k=rng.randint(0, 2)):
+            names.append(name + suffix)
+
+    rows = [[f"id{i}", name, rng.randint(0, 100)] for i, name in enumerate(names)]
+    return sorted(rows[:n_tracks], key=lambda row: len(row[1]))
+
+
+def benchmark_filter_similar_song_names(sizes: List[int] = [10, 1000, 10000]):
+    """Compares filter_similar_song_names against the quadratic reference
+    implementation on synthetic artists.
+
+    Args:
+        sizes (List[int], optional): number of tracks per synthetic artist.
+            Defaults to [10, 1000, 10000].
+    """
+    for n_tracks in sizes:
+        rows = synthetic_artist_tracks(n_tracks)
+
+        if filter_similar_song_names(rows) != filter_similar_song_names_naive(rows):
+            raise BenchmarkMismatch(
+                f"Filtered tracks differ for artist with {n_tracks} tracks"
+            )
+
+        repeats = max(1, 1000 // n_tracks)
+        naive = timeit.timeit(
+            lambda: filter_similar_song_names_naive(rows), number=repeats
+        )
+        indexed = timeit.timeit(lambda: filter_similar_song_names(rows), number=repeats)
+
+        log.info(
+            f"filter_similar_song_names with {n_tracks} tracks: "
+            f"naive {naive / repeats * 1000:.2f} ms, "
+            f"indexed {indexed / repeats * 1000:.2f} ms, "
+            f"speedup {naive / indexed:.1f}x"
+        )
+
+
+class StubGeniusClient:
+    """Offline stand-in for lyricsgenius.Genius with fixed latency and errors."""
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.05, seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def search_song(self, title: str, artist: str):
+        time.sleep(self.latency)
+
+        if self.rng.random() < self.error_rate:
+            raise ConnectionError("stub request failed")
+
+        return SimpleNamespace(lyrics=f"{title} by {artist}\nla la la")
+
+
+def benchmark_lyrics_fetcher(
+    workers: List[int] = [1, 8, 32], n_songs: int = 200, latency: float = 0.05
+):
+    """Measures the throughput of fetch_lyrics_concurrently against a stub client.
+
+    Args:
+        workers (List[int], optional): worker counts to compare.
+            Defaults to [1, 8, 32].
+        n_songs (int, optional): songs fetched per run. Defaults to 200.
+        latency (float, optional): seconds per stub request. Defaults to 0.05.
+    """
+    songs = [(f"id{i}", f"Song {i}", "Artist") for i in range(n_songs)]
+
+    for n_workers in workers:
+        lyrics_getter.genius = StubGeniusClient(latency)
+
+        start = time.perf_counter()
+        results = list(
+            fetch_lyrics_concurrently(
+                songs,
+                lyrics_getter.search_song_lyrics,
+                workers=n_workers,
+                rate=1000.0,
+                backoff=latency,
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        failed = sum(1 for _, lyrics, _ in results if lyrics is None)
+        log.info(
+            f"fetch_lyrics_concurrently with {n_workers} workers: "
+            f"{len(results) / elapsed:.1f} songs/sec, {failed} failed"
+        )
+
+
+def reference_score_lyrics(lyrics: str) -> List[float]:
+    """Previous implementation of score_lyrics with repeated replace and count
+    calls, kept as reference for benchmark_score_lyrics."""
+    lyrics = (
+        lyrics.replace(",", " ")
+        .replace("(", " ")
+        .replace(")", " ")
+        .replace("\n", " ")
+        .lower()
+    )
+    lyrics_split = list(filter(None, lyrics.split(" ")))
+
+    if not lyrics_split:
+        return
+
+    rep_score = sum(
+        [n for n in [lyrics_split.count(x) for x in set(lyrics_split)] if n > 1]
+    ) / len(lyrics_split)
+    div_score = len(set(lyrics_split)) / len(lyrics_split)
+    return [len(lyrics_split), rep_score, div_score]
+
+
+def synthetic_lyrics(n_words: int, vocabulary: int, seed: int = 42) -> str:
+    """Generates lyrics with lines of words, punctuation and repetitions.
+
+    Args:
+        n_words (int): number of words
+        vocabulary (int): number of distinct words to choose from
+        seed (int, optional): seed for the random generator. Defaults to 42.
+
+    Returns:
+        str: the lyrics
+    """
+    rng = random.Random(seed)
+    words = [f"Word{i}" for i in range(vocabulary)] + ["(oh)", "yeah,", "\t", ""]
+
+    lines = []
+    while n_words > 0:
+        line = " ".join(rng.choices(words, k=min(n_words, rng.randint(3, 10))))
+        lines.append(line)
+        n_words -= line.count(" ") + 1
+    return "\n".join(lines)
+
+
+def benchmark_score_lyrics(sizes: List[int] = [200, 2000, 20000]):
+    """Checks that score_lyrics returns identical scores to the reference
+    implementation and compares their speed on long lyrics.
+
+    Args:
+        sizes (List[int], optional): number of words of the synthetic lyrics.
+            Defaults to [200, 2000, 20000].
+    """
+    for seed in range(100):
+        lyrics = synthetic_lyrics(random.Random(seed).randint(0, 500), 50, seed)
+        if score_lyrics(lyrics) != reference_score_lyrics(lyrics):
+            raise BenchmarkMismatch(
+                f"Lyrics scores differ from reference for seed {seed}"
+            )
+
+    for n_words in sizes:
+        lyrics = synthetic_lyrics(n_words, vocabulary=n_words // 4)
+
+        repeats = max(1, 20000 // n_words)
+        reference = timeit.timeit(
+            lambda: reference_score_lyrics(lyrics), number=repeats
+        )
+        single_pass = timeit.timeit(lambda: score_lyrics(lyrics), number=repeats)
+
+        log.info(
+            f"score_lyrics with {n_words} words: "
+            f"reference {reference / repeats * 1000:.2f} ms, "
+            f"single pass {single_pass / repeats * 1000:.2f} ms, "
+            f"speedup {reference / single_pass:.1f}x"
+        )
+
+
+def benchmark_popularity_labels(n_rows: int = 100000):
+    """Checks that the column versions of the labeling functions in pre_training
+    return the same labels as the scalar versions and compares their speed.
+
+    Args:
+        n_rows (int, optional): number of synthetic rows. Defaults to 100000.
+    """
+    rng = random.Random(42)
+    popularity = pd.Series([rng.randint(0, 100) for _ in range(n_rows)])
+    genres = pd.Series(
+        [
+            rng.choice(["dance pop", "german hip hop", "k-pop", "indie rock", "trap"])
+            for _ in range(n_rows)
+        ]
+    )
+
+    pairs = [
+        (t.multiclass_popularity, t.multiclass_popularity_column, popularity),
+        (t.binary_popularity, t.binary_popularity_column, popularity),
+        (t.scale_popularity, t.scale_popularity_column, popularity),
+        (t.encode_genre, t.encode_genre_column, genres),
+    ]
+
+    for scalar, column, data in pairs:
+        if not data.apply(scalar).equals(column(data)):
+            raise BenchmarkMismatch(
+                f"Labels of {column.__name__} differ from {scalar.__name__}"
+            )
+
+        applied = timeit.timeit(lambda: data.apply(scalar), number=3) / 3
+        vectorized = timeit.timeit(lambda: column(data), number=3) / 3
+
+        log.info(
+            f"{column.__name__} with {n_rows} rows: "
+            f"apply {applied * 1000:.2f} ms, "
+            f"column {vectorized * 1000:.2f} ms, "
+            f"speedup {applied / vectorized:.1f}x"
+        )
+
+
+TRACKS_HEADER = [
+    "id", "name", "popularity", "duration_ms", "explicit", "artists",
+    "id_artists", "release_date", "danceability", "energy", "key", "loudness",
+    "mode", "speechiness", "acousticness", "instrumentalness", "liveness",
+    "valence", "tempo", "time_signature",
+]  # fmt: skip
+
+
+def write_synthetic_tracks_csv(csv_path: Path, n_rows: int, seed: int = 42):
+    """Writes a tracks.csv with the columns and value formats of the spotify
+    dataset, including quoted names with commas and newlines.
+
+    Args:
+        csv_path (Path): path of the csv file
+        n_rows (int): number of tracks
+        seed (int, optional): seed for the random generator. Defaults to 42.
+    """
+    rng = random.Random(seed)
+
+    with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(TRACKS_HEADER)
+
+        for i in range(n_rows):
+            n_artists = rng.randint(1, 3)
+            artist_ids = [f"artist{rng.randint(0, 10000)}" for _ in range(n_artists)]
+            name = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+            name += rng.choice(["", ", Pt. 2", "\n(Live)", ' "Remix"'])
+
+            row = [
+                f"track{i}",
+                name,
+                rng.randint(0, 100),
+                rng.randint(60000, 400000),
+                rng.randint(0, 1),
+                str([f"Artist {a}" for a in artist_ids]),
+                str(artist_ids),
+                rng.choice(["1999", "2005-01-01", "2019-11-29"]),
+                *[round(rng.random(), rng.randint(1, 6)) for _ in range(3)],
+                rng.uniform(-30, 0),
+                rng.randint(0, 1),
+                *[rng.random() for _ in range(5)],
+                rng.uniform(50, 200),
+                rng.randint(1, 5),
+            ]
+
+            # malformed lines, which both ingestions have to skip
+            if i % 10000 == 4999:
+                row = row[:-3]
+            elif i % 10000 == 9999:
+                row.append(0)
+
+            writer.writerow(row)
+
+
+def ingest_tracks(read_chunks: Callable, csv_path: Path) -> sqlite3.Connection:
+    """Ingests a tracks.csv into an in-memory database.
+
+    Args:
+        read_chunks (Callable): function yielding chunks of processed rows
+        csv_path (Path): path of the csv file
+
+    Returns:
+        sqlite3.Connection: the connection to the in-memory database
+    """
+    cnx = sqlite3.connect(":memory:")
+    cursor = cnx.cursor()
+    cursor.execute(TABLES["tracks"])
+
+    for rows in read_chunks(csv_path):
+        db.insert_tracks_bulk(rows, cnx, cursor)
+    return cnx
+
+
+def read_track_rows(csv_path: Path):
+    for chunk in read_csv_chunks(csv_path, 50000):
+        # rows which process_track_row rejects are skipped like in the bulk reader
+        rows = (process_track_row(row) for row in chunk)
+        yield [row for row in rows if row is not None]
+
+
+def read_track_frames(csv_path: Path):
+    for chunk in read_csv_frames(csv_path, 50000, TRACKS_TEXT_COLUMNS):
+        yield frame_to_rows(process_tracks_frame(chunk))
+
+
+def same_value(a, b) -> bool:
+    # sqlite converts numeric text slightly differently than pandas parses it
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, float) and isinstance(b, float):
+        if math.isnan(a) or math.isnan(b):
+            return math.isnan(a) and math.isnan(b)
+        return math.isclose(a, b)
+    return a == b
+
+
+def benchmark_csv_ingest(n_rows: int = 200000):
+    """Checks that the vectorized ingestion of tracks.csv stores the same tracks
+    as the row by row ingestion and compares their rows/sec.
+
+    Args:
+        n_rows (int, optional): number of synthetic tracks. Defaults to 200000.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / "tracks.csv"
+        write_synthetic_tracks_csv(csv_path, n_rows)
+
+        results = {}
+        for name, read_chunks in [
+            ("rows", read_track_rows),
+            ("frames", read_track_frames),
+        ]:
+            start = time.perf_counter()
+            cnx = ingest_tracks(read_chunks, csv_path)
+            elapsed = time.perf_counter() - start
+
+            results[name] = cnx.execute("SELECT * FROM tracks ORDER BY id;").fetchall()
+            cnx.close()
+
+            log.info(f"Ingest tracks.csv by {name}: {n_rows / elapsed:.0f} rows/sec")
+
+    if len(results["rows"]) != len(results["frames"]):
+        raise BenchmarkMismatch(
+            f"Ingested {len(results['rows'])} tracks by rows, "
+            f"but {len(results['frames'])} by frames"
+        )
+
+    for row, frame_row in zip(results["rows"], results["frames"]):
+        if not all(same_value(a, b) for a, b in zip(row, frame_row)):
+            raise BenchmarkMismatch(
+                f"Track ingested by frames differs: {row} != {frame_row}"
+            )
+
+
+def benchmark_model_evaluation(n_rows: int = 50000, n_estimators: int = 250):
+    """Checks that the confusion matrices of ModelEvaluation match sklearn's and
+    compares one cached prediction to the three predictions of the previous
+    metrics and plots.
+
+    Args:
+        n_rows (int, optional): number of synthetic test rows. Defaults to 50000.
+        n_estimators (int, optional): trees of the random forest. Defaults to 250.
+    """
+    rng = np.random.default_rng(42)
+    X = rng.random((n_rows, 15))
+    y = t.multiclass_popularity_column(pd.Series(X[:, :3].sum(axis=1) * 33))
+    clf = RandomForestClassifier(n_estimators=n_estimators, n_jobs=-1).fit(X, y)
+
+    start = time.perf_counter()
+    evaluation = ModelEvaluation(clf, X, y)
+    cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for normalize in (None, None, "true"):
+        reference = confusion_matrix(y, clf.predict(X), normalize=normalize)
+    repeated = time.perf_counter() - start
+
+    if not np.allclose(evaluation.get_confusion_matrix("true"), reference):
+        raise BenchmarkMismatch(
+            "Confusion matrix of ModelEvaluation differs from sklearn"
+        )
+
+    log.info(
+        f"Evaluation of {n_rows} rows with {n_estimators} trees: "
+        f"three predictions {repeated:.2f} s, "
+        f"cached prediction {cached:.2f} s, "
+        f"speedup {repeated / cached:.1f}x"
+    )
+
+
+BENCHMARKS = {
+    "filter_similar_song_names": benchmark_filter_similar_song_names,
+    "lyrics_fetcher": benchmark_lyrics_fetcher,
+    "score_lyrics": benchmark_score_lyrics,
+    "popularity_labels": benchmark_popularity_labels,
+    "csv_ingest": benchmark_csv_ingest,
+    "model_evaluation": benchmark_model_evaluation,
+}
+
+
+def run_benchmarks(names: List[str] = None) -> int:
+    """Runs the specified benchmarks or all benchmarks if none are specified.
+
+    Args:
+        names (List[str], optional): names of benchmarks to run. Defaults to None.
+
+    Returns:
+        int: number of unknown benchmarks and benchmarks with differing results
+    """
+    failed = 0
+
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            log.error(f"Unknown benchmark '{name}'")
+            failed += 1
+            continue
+
+        log.info(f"Running benchmark '{name}'")
+        try:
+            BENCHMARKS[name]()
+        except BenchmarkMismatch as err:
+            log.error(f"Benchmark '{name}' failed: {err}")
+            failed += 1
+
+    return failed
@@ -1,24 +1,360 @@
+import gzip
+import logging
 import os
+import re
+import shutil
+import sqlite3
 from datetime import datetime
+from pathlib import Path
 from sqlite3.dbapi2 import connect
+from typing import IO, Dict, Iterator, List, Optional, Tuple
 
-from .db_interface import connect_to_db
+from dotenv import load_dotenv
 
+from .db_interface import close_connections, connect_to_db, get_db_path
 
-def dump_db(db_name: str):
-    """Dumps the specified database into a .sql file.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger("db")
+
+load_dotenv()
+
+DUMPS_PATH = Path(os.getenv("DATA_PATH")) / "databases" / "dumps"
+BACKUPS_PATH = Path(os.getenv("DATA_PATH")) / "databases" / "backups"
+
+# file extension by compression
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# db_name;timestamp.kind[.compression]
+FILE_NAME_PATTERN = re.compile(
+    r"^(?P<db_name>[^;]+);(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})"
+    r"\.(?P<kind>sql|db|delta\.sql)(?P<extension>\.gz|\.zst)?$"
+)
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+# primary keys of rows changed since the last dump, filled by triggers
+CHANGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS _changes
+    (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        pk TEXT NOT NULL
+    );
+"""
+
+# last seq of _changes contained in a dump
+BACKUP_STATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS _backup_state
+    (
+        id INTEGER PRIMARY KEY CHECK (id == 0),
+        watermark INTEGER NOT NULL
+    );
+"""
+
+
+def open_file(path: Path, mode: str, compression: Optional[str] = None) -> IO:
+    """Opens a file, which is compressed or decompressed on the fly.
+
+    Args:
+        path (Path): path of the file
+        mode (str): mode as for open(), text files are utf-8 encoded
+        compression (Optional[str], optional): None, "gzip" or "zstd".
+            Defaults to None.
+
+    Raises:
+        ValueError: unknown compression or zstandard is not installed
+
+    Returns:
+        IO: the file object
+    """
+    encoding = None if "b" in mode else "utf-8"
+
+    if compression is None:
+        return open(path, mode, encoding=encoding)
+
+    # compressed files are opened in binary mode by default
+    if encoding is not None:
+        mode += "t"
+
+    if compression == "gzip":
+        return gzip.open(path, mode, encoding=encoding)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.open(path, mode, encoding=encoding)
+
+    raise ValueError(f"Unknown compression '{compression}'")
+
+
+def backup_file_name(db_name: str, kind: str, compression: Optional[str]) -> str:
+    """Returns the file name of a new dump or backup of a database.
+
+    Args:
+        db_name (str): the name of the database
+        kind (str): "sql" for dumps, "delta.sql" for deltas, "db" for backups
+        compression (Optional[str]): None, "gzip" or "zstd"
+
+    Raises:
+        ValueError: unknown compression
+
+    Returns:
+        str: the file name
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'")
+
+    timestamp = "{:%Y-%m-%d_%H-%M-%S}".format(datetime.now())
+    return f"{db_name};{timestamp}.{kind}{COMPRESSIONS[compression]}"
+
+
+def parse_file_name(file_name: str) -> Optional[Tuple[str, datetime, str, str]]:
+    """Parses the file name of a dump or backup.
+
+    Args:
+        file_name (str): the file name
+
+    Returns:
+        Optional[Tuple[str, datetime, str, str]]: (db_name, timestamp, kind,
+            compression) or None if it is not a dump or backup
+    """
+    match = FILE_NAME_PATTERN.match(file_name)
+    if match is None:
+        return None
+
+    compression = {
+        extension: compression for compression, extension in COMPRESSIONS.items()
+    }[match["extension"] or ""]
+
+    return (
+        match["db_name"],
+        datetime.strptime(match["timestamp"], TIMESTAMP_FORMAT),
+        match["kind"],
+        compression,
+    )
+
+
+def find_files(directory: Path, db_name: str, kind: str) -> List[Tuple[datetime, Path]]:
+    """Finds the dumps or backups of a database.
+
+    Args:
+        directory (Path): directory of the files
+        db_name (str): the name of the database
+        kind (str): "sql" for dumps, "delta.sql" for deltas, "db" for backups
+
+    Returns:
+        List[Tuple[datetime, Path]]: (timestamp, path) of the files, oldest first
+    """
+    if not directory.is_dir():
+        return []
+
+    files = []
+    for file_name in os.listdir(directory):
+        parsed = parse_file_name(file_name)
+        if parsed is not None and parsed[0] == db_name and parsed[2] == kind:
+            files.append((parsed[1], directory / file_name))
+
+    return sorted(files)
+
+
+def find_latest_file(directory: Path, db_name: str, kind: str) -> Optional[Path]:
+    """Finds the most recent dump or backup of a database.
+
+    Args:
+        directory (Path): directory of the files
+        db_name (str): the name of the database
+        kind (str): "sql" for dumps, "delta.sql" for deltas, "db" for backups
+
+    Returns:
+        Optional[Path]: path of the file or None if there is none
+    """
+    files = find_files(directory, db_name, kind)
+
+    if len(files) == 0:
+        return None
+    return files[-1][1]
+
+
+def tracked_tables(cnx: sqlite3.Connection) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Returns the tables whose changes are tracked, in order of creation.
+
+    Args:
+        cnx (sqlite3.Connection): the connection to the db
+
+    Returns:
+        Dict[str, Tuple[List[str], List[str]]]: (columns, primary key columns)
+            by table name
+    """
+    query = """
+        SELECT name
+        FROM sqlite_master
+        WHERE type == 'table'
+        AND name NOT LIKE 'sqlite%'
+        AND name NOT LIKE '\\_%' ESCAPE '\\'
+        ORDER BY rowid;
+    """
+
+    tables = {}
+    for (table,) in cnx.execute(query).fetchall():
+        info = cnx.execute(f'PRAGMA table_info("{table}");').fetchall()
+        columns = [column[1] for column in info]
+        pk = [column[1] for column in sorted(info, key=lambda c: c[5]) if column[5]]
+
+        if len(pk) == 0:
+            log.warning(f"Not tracking changes of table {table} without primary key")
+            continue
+        tables[table] = (columns, pk)
+
+    return tables
+
+
+def enable_change_tracking(cnx: sqlite3.Connection):
+    """Creates the change log and the triggers which record the primary keys of
+    inserted, updated and deleted rows, if they do not exist yet.
+
+    Args:
+        cnx (sqlite3.Connection): the connection to the db
+    """
+    cnx.execute(CHANGES_TABLE)
+    cnx.execute(BACKUP_STATE_TABLE)
+
+    # a negative watermark marks that no full dump contains the tracked changes
+    cnx.execute("INSERT OR IGNORE INTO _backup_state VALUES (0, -1);")
+
+    for table, (columns, pk) in tracked_tables(cnx).items():
+        for event, rows in [
+            ("INSERT", ["NEW"]),
+            ("UPDATE", ["OLD", "NEW"]),
+            ("DELETE", ["OLD"]),
+        ]:
+            inserts = ""
+            for row in rows:
+                keys = ", ".join(f'{row}."{column}"' for column in pk)
+                inserts += (
+                    f"INSERT INTO _changes (table_name, pk) "
+                    f"VALUES ('{table}', json_array({keys})); "
+                )
+
+            cnx.execute(
+                f'CREATE TRIGGER IF NOT EXISTS "_track_{table}_{event.lower()}" '
+                f'AFTER {event} ON "{table}" BEGIN {inserts}END;'
+            )
+
+
+def is_tracking_changes(cnx: sqlite3.Connection) -> bool:
+    """Checks whether the change log of the deltas exists in the database.
+
+    Args:
+        cnx (sqlite3.Connection): the connection to the db
+
+    Returns:
+        bool: True if changes are tracked
+    """
+    query = """
+        SELECT COUNT(*)
+        FROM sqlite_master
+        WHERE type == 'table' AND name IN ('_changes', '_backup_state');
+    """
+    return cnx.execute(query).fetchone()[0] == 2
+
+
+def track_changes(db_name: str):
+    """Starts tracking the changes of the database for delta dumps, or adds the
+    triggers of new tables. Deltas contain the changes after the next full dump.
 
     Args:
         db_name (str): the name of the database
     """
-    dump_path = (
-        os.getenv("DATA_PATH")
-        + "\\databases\\dumps\\"
-        + db_name
-        + ";"
-        + "{:%Y-%m-%d_%H-%M-%S}".format(datetime.now())
-        + ".sql"
+    cnx, cursor = connect_to_db(db_name)
+
+    with cnx:
+        enable_change_tracking(cnx)
+
+    log.info(f"Tracking changes of database {db_name}")
+
+
+def iter_delta_statements(
+    cnx: sqlite3.Connection, watermark: int, last_seq: int
+) -> Iterator[str]:
+    """Generates the statements which apply the changes between two positions of
+    the change log. Changed rows are written with their current values, rows
+    which do not exist anymore are deleted.
+
+    Args:
+        cnx (sqlite3.Connection): the connection to the db
+        watermark (int): last seq contained in the previous dump
+        last_seq (int): last seq contained in this delta
+
+    Yields:
+        str: a statement
+    """
+    tables = tracked_tables(cnx)
+    changed = """
+        SELECT DISTINCT pk
+        FROM _changes
+        WHERE table_name == ? AND seq > ? AND seq <= ?
+    """
+
+    def key_of(pk: List[str]) -> str:
+        return " AND ".join(
+            f"t.\"{column}\" == json_extract(c.pk, '$[{i}]')"
+            for i, column in enumerate(pk)
+        )
+
+    # delete children before parents
+    for table, (columns, pk) in reversed(list(tables.items())):
+        condition = " || ' AND ' || ".join(
+            f"'\"{column}\" IS ' || quote(json_extract(c.pk, '$[{i}]'))"
+            for i, column in enumerate(pk)
+        )
+        query = f"""
+            SELECT 'DELETE FROM "{table}" WHERE ' || {condition} || ';'
+            FROM ({changed}) AS c
+            WHERE NOT EXISTS (SELECT 1 FROM "{table}" AS t WHERE {key_of(pk)});
+        """
+        for (statement,) in cnx.execute(query, [table, watermark, last_seq]):
+            yield statement
+
+    # insert parents before children
+    for table, (columns, pk) in tables.items():
+        names = ", ".join(f'"{column}"' for column in columns)
+        values = " || ',' || ".join(f'quote(t."{column}")' for column in columns)
+        query = f"""
+            SELECT 'INSERT OR REPLACE INTO "{table}" ({names}) VALUES(' || {values} || ');'
+            FROM ({changed}) AS c
+            INNER JOIN "{table}" AS t ON {key_of(pk)};
+        """
+        for (statement,) in cnx.execute(query, [table, watermark, last_seq]):
+            yield statement
+
+
+def clear_changes(cnx: sqlite3.Connection):
+    """Moves the watermark to the end of the change log and clears the log, so
+    the next delta starts from the current state of the database.
+
+    Args:
+        cnx (sqlite3.Connection): the connection to the db
+    """
+    cnx.execute(
+        "UPDATE _backup_state SET watermark = "
+        "(SELECT COALESCE(MAX(seq), MAX(watermark, 0)) FROM _changes);"
     )
+    cnx.execute(
+        "DELETE FROM _changes WHERE seq <= (SELECT watermark FROM _backup_state);"
+    )
+
+
+def dump_db(db_name: str, compression: Optional[str] = None):
+    """Dumps the specified database into a .sql file.
+
+    Args:
+        db_name (str): the name of the database
+        compression (Optional[str], optional): None, "gzip" or "zstd".
+            Defaults to None.
+    """
+    dump_path = DUMPS_PATH / backup_file_name(db_name, "sql", compression)
 
     if not os.path.exists(os.path.dirname(dump_path)):
         # create dirs on path if not exist
@@ -26,45 +362,216 @@ def dump_db(db_name: str):
 
     cnx, cursor = connect_to_db(db_name)
 
-    with open(dump_path, "w", encoding="utf-8") as dump_file:
+    # changes until now are contained in this dump, deltas start from here
+    if is_tracking_changes(cnx):
+        with cnx:
+            clear_changes(cnx)
+
+    with open_file(dump_path, "w", compression) as dump_file:
         for line in cnx.iterdump():
             dump_file.write("%s\n" % line)
 
-    cnx.close()
+    log.info(f"Dumped database {db_name} to {dump_path}")
 
 
-def load_db_dump(db_name: str):
-    """Loads the most recent database dump for the specified database.
+def dump_db_delta(db_name: str, compression: Optional[str] = None):
+    """Dumps the rows changed since the last dump or delta into a .delta.sql file.
+    Requires tracking the changes by track_changes and a full dump by dump_db
+    afterwards.
 
     Args:
         db_name (str): the name of the database
+        compression (Optional[str], optional): None, "gzip" or "zstd".
+            Defaults to None.
     """
-    # get all files in dir
-    dumps_dir = os.getenv("DATA_PATH") + "\\databases\\dumps\\"
-    dumps_list = os.listdir(dumps_dir)
+    if find_latest_file(DUMPS_PATH, db_name, "sql") is None:
+        log.critical(f"Failed dumping delta of {db_name}: no full dump found")
+        exit(1)
 
-    # filter files of the db with db_name
-    dumps_list = list(
-        filter(lambda file_name: file_name.split(";")[0] == db_name, dumps_list)
-    )
+    delta_path = DUMPS_PATH / backup_file_name(db_name, "delta.sql", compression)
+
+    cnx, cursor = connect_to_db(db_name)
+
+    if not is_tracking_changes(cnx):
+        log.critical(
+            f"Failed dumping delta of {db_name}: changes are not tracked, "
+            "run track_changes and dump_db first"
+        )
+        exit(1)
+
+    # block writers, so no change is committed between reading and clearing the log
+    cnx.execute("BEGIN IMMEDIATE;")
+    try:
+        watermark = cnx.execute("SELECT watermark FROM _backup_state;").fetchone()[0]
+
+        if watermark < 0:
+            cnx.rollback()
+            log.critical(
+                f"Failed dumping delta of {db_name}: "
+                "no full dump since tracking changes"
+            )
+            exit(1)
+
+        last_seq = cnx.execute(
+            "SELECT COALESCE(MAX(seq), ?) FROM _changes;", [watermark]
+        ).fetchone()[0]
+
+        if last_seq == watermark:
+            log.info(f"No changes in database {db_name} since the last dump")
+            cnx.rollback()
+            return
+
+        with open_file(delta_path, "w", compression) as delta_file:
+            delta_file.write("BEGIN TRANSACTION;\n")
+            for statement in iter_delta_statements(cnx, watermark, last_seq):
+                delta_file.write("%s\n" % statement)
+            delta_file.write("COMMIT;\n")
 
-    # sort list of files on dates
-    dumps_list.sort(
-        key=lambda file: datetime.strptime(file, f"{db_name};%Y-%m-%d_%H-%M-%S.sql")
+        cnx.execute("UPDATE _backup_state SET watermark = ?;", [last_seq])
+        cnx.execute("DELETE FROM _changes WHERE seq <= ?;", [last_seq])
+        cnx.commit()
+    except Exception as err:
+        cnx.rollback()
+        raise err
+
+    log.info(
+        f"Dumped {last_seq - watermark} changes of database {db_name} to {delta_path}"
     )
 
-    # get latest dump from sorted file list
-    latest_dump_file = dumps_dir + dumps_list[-1]
 
-    # read dump
-    f = open(latest_dump_file, "r", encoding="utf-8")
-    sql_dump = f.read()
+def iter_statements(lines: IO) -> Iterator[str]:
+    """Groups the lines of a sql dump into complete statements.
+
+    Args:
+        lines (IO): the lines of the dump
+
+    Yields:
+        str: a complete statement
+    """
+    statement = ""
+    for line in lines:
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+    if statement.strip():
+        log.warning(f"Ignoring incomplete statement at end of dump: {statement!r}")
+
+
+def load_db_dump(db_name: str):
+    """Loads the most recent database dump for the specified database and replays
+    the deltas dumped after it in order. Dumps are streamed statement by statement
+    instead of being read into memory.
+
+    Args:
+        db_name (str): the name of the database
+    """
+    dumps = find_files(DUMPS_PATH, db_name, "sql")
+
+    if len(dumps) == 0:
+        log.critical(f"Failed loading dump of {db_name}: no dump found")
+        exit(1)
+
+    # timestamps have seconds resolution, deltas of the same second are replayed
+    dump_time, latest_dump_file = dumps[-1]
+    deltas = [
+        delta_file
+        for delta_time, delta_file in find_files(DUMPS_PATH, db_name, "delta.sql")
+        if delta_time >= dump_time
+    ]
 
-    db_path = os.getenv("DATA_PATH") + "\\databases\\binaries\\" + db_name + ".db"
+    db_path = get_db_path(db_name)
 
-    # create database
-    cnx = connect(db_path)
+    # create database, transactions are controlled by the dump itself
+    cnx = connect(db_path, isolation_level=None)
 
     # load dump into database
-    cnx.cursor().executescript(sql_dump)
+    for dump_file_path in [latest_dump_file] + deltas:
+        compression = parse_file_name(dump_file_path.name)[3]
+        with open_file(dump_file_path, "r", compression) as dump_file:
+            for statement in iter_statements(dump_file):
+                cnx.execute(statement)
+        log.info(f"Loaded dump {dump_file_path} into database {db_name}")
+
+    # the triggers logged the replayed deltas, which are contained in the dumps
+    if is_tracking_changes(cnx):
+        with cnx:
+            clear_changes(cnx)
+
     cnx.close()
+
+
+def backup_db(db_name: str, compression: Optional[str] = None, pages: int = 4096):
+    """Copies the database with the online backup API of SQLite, so writers are
+    only blocked while a step of pages is copied.
+
+    Args:
+        db_name (str): the name of the database
+        compression (Optional[str], optional): None, "gzip" or "zstd".
+            Defaults to None.
+        pages (int, optional): pages copied per step. Defaults to 4096.
+    """
+    backup_path = BACKUPS_PATH / backup_file_name(db_name, "db", compression)
+    BACKUPS_PATH.mkdir(parents=True, exist_ok=True)
+
+    # the backup API writes a database file, which is compressed afterwards
+    copy_path = backup_path.with_name(backup_path.name + ".tmp")
+    next_percent = 0
+
+    def progress(status: int, remaining: int, total: int):
+        nonlocal next_percent
+        percent = 100 * (total - remaining) // max(total, 1)
+        if percent >= next_percent:
+            log.info(f"Backing up database {db_name}: {percent}% of {total} pages")
+            next_percent = percent + 10
+
+    source, cursor = connect_to_db(db_name, read_only=True)
+    target = sqlite3.connect(copy_path)
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+
+    if compression is None:
+        os.replace(copy_path, backup_path)
+    else:
+        with open(copy_path, "rb") as copy_file, open_file(
+            backup_path, "wb", compression
+        ) as backup_file:
+            shutil.copyfileobj(copy_file, backup_file, 1024 ** 2)
+        os.remove(copy_path)
+
+    log.info(f"Backed up database {db_name} to {backup_path}")
+
+
+def restore_db(db_name: str):
+    """Replaces the database with its most recent backup.
+
+    Args:
+        db_name (str): the name of the database
+    """
+    latest_backup_file = find_latest_file(BACKUPS_PATH, db_name, "db")
+
+    if latest_backup_file is None:
+        log.critical(f"Failed restoring {db_name}: no backup found")
+        exit(1)
+
+    compression = parse_file_name(latest_backup_file.name)[3]
+    db_path = get_db_path(db_name)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # decompress next to the database, so it can be replaced atomically
+    restore_path = db_path.with_name(db_path.name + ".restore")
+    with open_file(latest_backup_file, "rb", compression) as backup_file, open(
+        restore_path, "wb"
+    ) as restore_file:
+        shutil.copyfileobj(backup_file, restore_file, 1024 ** 2)
+
+    # a log of the replaced database must not be applied to the restored one
+    close_connections()
+    for suffix in ("-wal", "-shm"):
+        db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+    os.replace(restore_path, db_path)
+
+    log.info(f"Restored database {db_name} from {latest_backup_file}")
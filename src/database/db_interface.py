@@ -1,15 +1,71 @@
+import atexit
 import logging
 import os
 import sqlite3
-from typing import List, Tuple
+import threading
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
 
 from ..dataset.preprocessing import process_artist_row, process_track_row
 
 log = logging.getLogger("db")
 
+# seconds to wait for a lock held by another connection
+BUSY_TIMEOUT = 30.0
 
-def connect_to_db(db_name: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
-    """Connects to the database and returns the connection and the cursor.
+# applied to every connection, WAL is only set by writable connections
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 ** 2,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# open connections by (pid, thread, db_name, read_only)
+connections: Dict[Tuple[int, int, str, bool], sqlite3.Connection] = {}
+connections_lock = threading.Lock()
+
+
+def get_db_path(db_name: str) -> Path:
+    """Returns the path of the database file.
+
+    Args:
+        db_name (str): name of the database
+
+    Returns:
+        Path: path of the database file
+    """
+    return Path(os.getenv("DATA_PATH")) / "databases" / "binaries" / f"{db_name}.db"
+
+
+def is_open(cnx: sqlite3.Connection) -> bool:
+    """Checks if a connection has not been closed.
+
+    Args:
+        cnx (sqlite3.Connection): the connection
+
+    Returns:
+        bool: True if the connection is usable
+    """
+    try:
+        cnx.execute("SELECT 1;")
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def connect_to_db(
+    db_name: str, read_only: bool = False
+) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
+    """Connects to the database and returns the connection and a new cursor.
+
+    Connections are reused per process and thread, until they are closed. Writable
+    connections switch the database to WAL mode, so readers do not block the writer.
+
+    Args:
+        db_name (str): name of the database
+        read_only (bool, optional): True to open the database read-only.
+            Defaults to False.
 
     Raises:
         Error: unknown error while connecting to the database
@@ -17,23 +73,63 @@ def connect_to_db(db_name: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
     Returns:
         Tuple[sqlite3.Connection, sqlite3.Cursor]: connection and cursor
     """
-    db_path = os.getenv("DATA_PATH") + "\\databases\\binaries\\" + str(db_name) + ".db"
+    key = (os.getpid(), threading.get_ident(), str(db_name), read_only)
+
+    with connections_lock:
+        cnx = connections.get(key)
+
+    if cnx is not None and is_open(cnx):
+        return (cnx, cnx.cursor())
 
-    if not os.path.exists(db_path):
+    db_path = get_db_path(db_name)
+
+    if not db_path.exists():
         log.critical(
             f"Failed connecting to database '{db_name}': database does not exist"
         )
         exit(1)
 
     try:
-        cnx = sqlite3.connect(db_path)
+        if read_only:
+            cnx = sqlite3.connect(
+                db_path.resolve().as_uri() + "?mode=ro",
+                uri=True,
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+            )
+        else:
+            cnx = sqlite3.connect(
+                db_path, timeout=BUSY_TIMEOUT, check_same_thread=False
+            )
+            cnx.execute("PRAGMA journal_mode = WAL;")
+
+        for pragma, value in PRAGMAS.items():
+            cnx.execute(f"PRAGMA {pragma} = {value};")
+
         cursor = cnx.cursor()
     except Exception as err:
         log.error(f"Failed connecting to database")
         raise err
+
+    with connections_lock:
+        connections[key] = cnx
     return (cnx, cursor)
 
 
+def close_connections():
+    """Closes all connections of this process, called at exit."""
+    with connections_lock:
+        for key in [key for key in connections if key[0] == os.getpid()]:
+            cnx = connections.pop(key)
+            try:
+                cnx.close()
+            except sqlite3.Error as err:
+                log.warning(f"Failed closing connection to '{key[2]}': {err}")
+
+
+atexit.register(close_connections)
+
+
 def insert_track(row: List, cnx: sqlite3.Connection, cursor: sqlite3.Cursor):
     """Inserts a new track into the db.
 
@@ -61,6 +157,46 @@ def insert_track(row: List, cnx: sqlite3.Connection, cursor: sqlite3.Cursor):
     log.info(f"Inserted track with name {row[1]}")
 
 
+def insert_tracks_bulk(
+    processed_rows: List[List[str]], cnx: sqlite3.Connection, cursor: sqlite3.Cursor
+) -> List[int]:
+    """Inserts a chunk of processed track rows into the db in a single transaction.
+
+    If the chunk fails as a whole, it is rolled back and the rows are retried
+    one by one to separate the rejected rows from the valid ones.
+
+    Args:
+        processed_rows (List[List[str]]): track rows processed by process_track_row
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Returns:
+        List[int]: indices of the rows rejected by the db
+    """
+    query = """
+        INSERT INTO tracks
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+    """
+    rejected_indices = []
+
+    try:
+        cursor.executemany(query, processed_rows)
+    except sqlite3.Error as err:
+        log.warning(f"Failed inserting chunk of tracks, retrying row by row: {err}")
+        cnx.rollback()
+
+        for idx, row in enumerate(processed_rows):
+            try:
+                cursor.execute(query, row)
+            except sqlite3.Error as row_err:
+                log.warning(f"Failed inserting track with id {row[0]}: {row_err}")
+                rejected_indices.append(idx)
+
+    cnx.commit()
+    log.info(f"Inserted {len(processed_rows) - len(rejected_indices)} tracks")
+    return rejected_indices
+
+
 def insert_song_status(status: List, cnx: sqlite3.Connection, cursor: sqlite3.Cursor):
     """Inserts a new status into the db.
 
@@ -87,6 +223,35 @@ def insert_song_status(status: List, cnx: sqlite3.Connection, cursor: sqlite3.Cu
     log.info(f"Inserted track with id {status[0]}")
 
 
+def insert_song_status_bulk(
+    statuses: List[List], cnx: sqlite3.Connection, cursor: sqlite3.Cursor
+):
+    """Inserts new statuses into the db in a single transaction. Already existing
+    statuses are ignored.
+
+    Args:
+        statuses (List[List]): rows of tracks_status table
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+    """
+
+    query = """
+        INSERT OR IGNORE INTO track_status
+        VALUES (?, ?, ?, ?);
+    """
+    try:
+        cursor.executemany(query, statuses)
+        cnx.commit()
+    except sqlite3.Error as err:
+        log.error(f"Failed inserting {len(statuses)} track statuses: {err}")
+        cnx.rollback()
+        raise err
+    log.info(f"Inserted {len(statuses)} track statuses")
+
+
 def update_song_status(
     cnx: sqlite3.Connection,
     cursor: sqlite3.Cursor,
@@ -104,21 +269,21 @@ def update_song_status(
         cnx (sqlite3.Connection): the connection to the db
         cursor (sqlite3.Cursor): the cursor of the db
     """
-    query_skipped = f"""
+    query_skipped = """
         UPDATE track_status
-        SET lyrics_skipped = {lyrics_skipped}
-        WHERE song_id == "{song_id}";
+        SET lyrics_skipped = ?
+        WHERE song_id == ?;
     """
 
-    query_stored = f"""
+    query_stored = """
         UPDATE track_status
-        SET lyrics_stored = {lyrics_stored}
-        WHERE song_id == "{song_id}";
+        SET lyrics_stored = ?
+        WHERE song_id == ?;
     """
 
     if lyrics_skipped != -1:
         try:
-            cursor.execute(query_skipped)
+            cursor.execute(query_skipped, [lyrics_skipped, song_id])
             cnx.commit()
         except sqlite3.Error as err:
             log.error(f"Failed updating track status with song id {song_id}: {err}")
@@ -128,7 +293,7 @@ def update_song_status(
 
     if lyrics_stored != -1:
         try:
-            cursor.execute(query_stored)
+            cursor.execute(query_stored, [lyrics_stored, song_id])
             cnx.commit()
         except sqlite3.Error as err:
             log.error(f"Failed updating track status with song id {song_id}: {err}")
@@ -148,14 +313,14 @@ def update_generation(
         song_id (str): id of the song
         gen (int): generation
     """
-    query = f"""
+    query = """
         UPDATE track_status
-        SET generation = {gen}
-        WHERE song_id == "{song_id}";
+        SET generation = ?
+        WHERE song_id == ?;
     """
 
     try:
-        cursor.execute(query)
+        cursor.execute(query, [gen, song_id])
         cnx.commit()
     except sqlite3.Error as err:
         log.error(f"Failed updating generation with song id {song_id}: {err}")
@@ -164,6 +329,39 @@ def update_generation(
     log.info(f"Updated generation from song id {song_id}")
 
 
+def update_track_status_bulk(
+    transitions: List[Tuple[int, int, int, str]],
+    cnx: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+):
+    """Updates generation, lyrics_skipped and lyrics_stored of many track_status
+    entries in a single transaction.
+
+    Args:
+        transitions (List[Tuple[int, int, int, str]]): (generation, lyrics_skipped,
+            lyrics_stored, song_id) tuples
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+    """
+    query = """
+        UPDATE track_status
+        SET generation = ?, lyrics_skipped = ?, lyrics_stored = ?
+        WHERE song_id == ?;
+    """
+
+    try:
+        cursor.executemany(query, transitions)
+        cnx.commit()
+    except sqlite3.Error as err:
+        log.error(f"Failed updating {len(transitions)} track statuses: {err}")
+        cnx.rollback()
+        raise err
+    log.info(f"Updated {len(transitions)} track statuses")
+
+
 def insert_artist(row: List, cnx: sqlite3.Connection, cursor: sqlite3.Cursor):
     """Inserts a new artist and if necessary new genres into the db.
 
@@ -268,6 +466,68 @@ def insert_artist_genres(
             continue
 
 
+def get_genres(cursor: sqlite3.Cursor) -> Set[str]:
+    """Query db and return the names of all known genres.
+
+    Args:
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+
+    Returns:
+        Set[str]: set of genre names
+    """
+    try:
+        cursor.execute("SELECT name FROM genres;")
+        return set(map(lambda x: x[0], cursor.fetchall()))
+    except sqlite3.Error as err:
+        log.error(f"Failed querying genres: {err}")
+        raise err
+
+
+def insert_artists_bulk(
+    artist_rows: List[List[str]],
+    artist_genres: List[Tuple[str, str]],
+    known_genres: Set[str],
+    cnx: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+):
+    """Inserts a chunk of artists, their new genres and artist-genre mappings into
+    the db in a single transaction. Already existing rows are ignored.
+
+    Args:
+        artist_rows (List[List[str]]): artist rows processed by process_artist_row
+        artist_genres (List[Tuple[str, str]]): (artist_id, genre) mappings
+        known_genres (Set[str]): genres already in the db, updated in place
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+    """
+    new_genres = {g for _, g in artist_genres if g not in known_genres}
+
+    try:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO artists VALUES (?, ?, ?, ?);", artist_rows
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO genres VALUES (?);", [(g,) for g in new_genres]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO artist_genres VALUES (?, ?);", artist_genres
+        )
+        cnx.commit()
+    except sqlite3.Error as err:
+        log.error(f"Failed inserting chunk of {len(artist_rows)} artists: {err}")
+        cnx.rollback()
+        raise err
+
+    known_genres.update(new_genres)
+    log.info(f"Inserted {len(artist_rows)} artists and {len(new_genres)} new genres")
+
+
 def insert_lyric_scores(
     song_id: str,
     lyric_scores: List[float],
@@ -291,3 +551,67 @@ def insert_lyric_scores(
         log.error(f"Failed inserting lyrics scores for song {song_id}: {err}")
         cnx.rollback()
         raise err
+
+
+def insert_lyric_scores_bulk(
+    lyric_scores: List[List],
+    cnx: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+):
+    """Inserts lyric scores of many songs in a single transaction.
+
+    Args:
+        lyric_scores (List[List]): (song_id, word_count, rep_score, div_score) rows
+            in the order of score_lyrics, inserted by position
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+    """
+    query = """
+        INSERT INTO lyric_scores
+        VALUES(?, ?, ?, ?);
+    """
+
+    try:
+        cursor.executemany(query, lyric_scores)
+        cnx.commit()
+        log.info(f"Inserted lyrics scores for {len(lyric_scores)} songs")
+    except sqlite3.Error as err:
+        log.error(
+            f"Failed inserting lyrics scores for {len(lyric_scores)} songs: {err}"
+        )
+        cnx.rollback()
+        raise err
+
+
+def insert_predictions_bulk(
+    predictions: List[List],
+    cnx: sqlite3.Connection,
+    cursor: sqlite3.Cursor,
+):
+    """Inserts the predictions of a model in a single transaction, previous
+    predictions of the model for the same songs are replaced.
+
+    Args:
+        predictions (List[List]): (song_id, model, label, probability) rows
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+
+    Raises:
+        Error: unknown error during sql query execution
+    """
+    query = """
+        INSERT OR REPLACE INTO predictions
+        VALUES(?, ?, ?, ?);
+    """
+
+    try:
+        cursor.executemany(query, predictions)
+        cnx.commit()
+        log.info(f"Inserted {len(predictions)} predictions")
+    except sqlite3.Error as err:
+        log.error(f"Failed inserting {len(predictions)} predictions: {err}")
+        cnx.rollback()
+        raise err
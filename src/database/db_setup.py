@@ -2,6 +2,8 @@ import logging
 import os
 import sqlite3
 
+from .db_interface import get_db_path
+
 log = logging.getLogger("db")
 
 
@@ -54,7 +56,7 @@ TABLES[
 ] = """CREATE TABLE track_status
         (
                 song_id TEXT,
-                song_valid BOOL,
+                generation INTEGER,
                 lyrics_skipped BOOL,
                 lyrics_stored BOOL,
                 PRIMARY KEY (song_id),
@@ -95,6 +97,99 @@ TABLES[
     );
     """
 
+TABLES[
+    "predictions"
+] = """CREATE TABLE predictions
+    (
+        song_id TEXT,
+        model TEXT,
+        label INTEGER,
+        probability REAL,
+        PRIMARY KEY (song_id, model),
+        FOREIGN KEY (song_id) REFERENCES tracks(id)
+    );
+    """
+
+INDEXES = {}
+INDEXES[
+    "tracks_release_year_popularity"
+] = """CREATE INDEX IF NOT EXISTS tracks_release_year_popularity
+    ON tracks (release_year, popularity);
+    """
+
+INDEXES[
+    "tracks_artist_release_year"
+] = """CREATE INDEX IF NOT EXISTS tracks_artist_release_year
+    ON tracks (primary_artist_id, release_year);
+    """
+
+# songs whose lyrics have not been crawled yet, see get_song_list
+INDEXES[
+    "track_status_pending"
+] = """CREATE INDEX IF NOT EXISTS track_status_pending
+    ON track_status (song_id)
+    WHERE generation == 1 AND lyrics_skipped == 0 AND lyrics_stored == 0;
+    """
+
+# songs with stored lyrics, see get_unscored_songs and the training frames
+INDEXES[
+    "track_status_stored"
+] = """CREATE INDEX IF NOT EXISTS track_status_stored
+    ON track_status (generation, song_id)
+    WHERE lyrics_stored == 1;
+    """
+
+
+def create_indexes(cursor: sqlite3.Cursor):
+    """Creates the indexes which do not exist yet and updates the statistics of
+    the query planner.
+
+    Args:
+        cursor (sqlite3.Cursor): the cursor of the db
+    """
+    for index in INDEXES:
+        cursor.execute(INDEXES[index])
+        log.info(f"Created index {index}")
+
+    cursor.execute("ANALYZE;")
+
+
+def migrate_db(db_name: str):
+    """Migrates an existing database to the current schema.
+
+    Args:
+        db_name (str): the name of the database
+    """
+    db_path = get_db_path(db_name)
+
+    if not os.path.exists(db_path):
+        log.critical(f"Failed migrating database {db_name}: database does not exist")
+        exit(1)
+
+    cnx = sqlite3.connect(db_path)
+    cursor = cnx.cursor()
+
+    # song_valid has been replaced by the generation of the preprocessing step
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(track_status);")]
+    if "song_valid" in columns:
+        cursor.execute(
+            "ALTER TABLE track_status RENAME COLUMN song_valid TO generation;"
+        )
+        log.info("Renamed column track_status.song_valid to generation")
+
+    # tables which have been added after the database has been created
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master;")]
+    for table in TABLES:
+        if table not in tables:
+            cursor.execute(TABLES[table])
+            log.info(f"Created table {table}")
+
+    create_indexes(cursor)
+
+    cnx.commit()
+    cnx.close()
+    log.info(f"Migrated database {db_name}")
+
 
 def create_db(db_name: str):
     """Creates a new database with the specified name if not exists.
@@ -108,7 +203,7 @@ def create_db(db_name: str):
         log.critical(f"Failed creating database: db_name is None")
         exit(1)
 
-    db_path = os.getenv("DATA_PATH") + "\\databases\\binaries\\" + db_name + ".db"
+    db_path = get_db_path(db_name)
 
     # check if db already exists
     if os.path.exists(db_path):
@@ -137,5 +232,7 @@ def create_db(db_name: str):
         cursor.execute(TABLES[table])
         log.info(f"Created table {table}")
 
+    create_indexes(cursor)
+
     cnx.commit()
     log.info(f"Created database {db_name}")
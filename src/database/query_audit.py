@@ -0,0 +1,135 @@
+import ast
+import logging
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Tuple
+
+from . import db_interface as db
+from .db_setup import TABLES
+
+log = logging.getLogger("db")
+
+SOURCE_PATH = Path(__file__).resolve().parents[1]
+
+QUERY_PATTERN = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s+\S")
+SCAN_PATTERN = re.compile(r"^SCAN (\w+)$")
+MISSING_TABLE_PATTERN = re.compile(r"^no such table: (?:\w+\.)?(\w+)$")
+
+# full scans which are intended, by "file:function" and table alias
+EXPECTED_SCANS: Dict[str, Set[str]] = {
+    # tables of the schema are listed to create the missing ones
+    "database/db_setup.py:migrate_db": {"sqlite_master"},
+    "database/db_backup.py:tracked_tables": {"sqlite_master"},
+    "database/db_backup.py:is_tracking_changes": {"sqlite_master"},
+    # all genres are loaded to skip known genres when inserting artists
+    "database/db_interface.py:get_genres": {"genres"},
+    # preprocessing reads all tracks of all artists
+    "dataset/preprocessing.py:filter_tracks": {"t"},
+    # every lyrics score joins its track, either side may drive the join
+    "training/pre_training.py:get_lyric_df": {"ls", "t"},
+    # artists are grouped by id for the artist frame
+    "training/pre_training.py:get_artist_df": {"a"},
+}
+
+
+def find_queries(source_path: Path = SOURCE_PATH) -> Iterator[Tuple[str, int, str]]:
+    """Finds the sql queries in the source code, which are string constants
+    starting with a DML keyword. Queries built with f-strings or concatenation
+    are not found, e.g. the generated statements of db_backup.
+
+    Args:
+        source_path (Path, optional): root directory of the source code.
+            Defaults to the src package.
+
+    Yields:
+        Tuple[str, int, str]: (location, line, query), location is
+            "file:function" relative to source_path
+    """
+    for file_path in sorted(source_path.rglob("*.py")):
+        tree = ast.parse(file_path.read_text(encoding="utf-8"))
+        file_name = file_path.relative_to(source_path).as_posix()
+        queries = {}
+
+        # outer functions are walked first, so nested functions overwrite them
+        for function in ast.walk(tree):
+            if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+
+            # the literal parts of f-strings are no complete queries
+            f_string_parts = {
+                id(value)
+                for node in ast.walk(function)
+                if isinstance(node, ast.JoinedStr)
+                for value in node.values
+            }
+
+            for node in ast.walk(function):
+                if (
+                    isinstance(node, ast.Constant)
+                    and id(node) not in f_string_parts
+                    and isinstance(node.value, str)
+                    and QUERY_PATTERN.match(node.value)
+                ):
+                    queries[(node.lineno, node.value)] = function.name
+
+        for (line, query), function_name in sorted(queries.items()):
+            yield (f"{file_name}:{function_name}", line, query)
+
+
+def explain_query(cursor: sqlite3.Cursor, query: str) -> List[str]:
+    """Returns the query plan of a query, parameters are bound to NULL.
+
+    Args:
+        cursor (sqlite3.Cursor): the cursor of the db
+        query (str): the query
+
+    Returns:
+        List[str]: details of the steps of the query plan
+    """
+    parameters = [None] * query.count("?")
+    cursor.execute("EXPLAIN QUERY PLAN " + query, parameters)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def audit_queries(db_name: str = "spotify_ds") -> int:
+    """Explains every query of the source code against the database and logs the
+    full table scans which are not expected and the queries which fail.
+
+    Queries of tables which are not part of the schema, e.g. of the lyrics cache,
+    are skipped. Queries built with f-strings are not audited, see find_queries.
+
+    Args:
+        db_name (str, optional): name of the database. Defaults to "spotify_ds".
+
+    Returns:
+        int: number of unexpected full table scans and failed queries
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+    unexpected = 0
+    audited = 0
+
+    for location, line, query in find_queries():
+        try:
+            plan = explain_query(cursor, query)
+        except sqlite3.Error as err:
+            missing_table = MISSING_TABLE_PATTERN.match(str(err))
+            if missing_table and missing_table.group(1) not in TABLES:
+                log.debug(f"Skipping query at {location} (line {line}): {err}")
+            else:
+                log.warning(f"Failed query at {location} (line {line}): {err}")
+                unexpected += 1
+            continue
+
+        audited += 1
+        for step in plan:
+            scan = SCAN_PATTERN.match(step)
+            if scan and scan.group(1) not in EXPECTED_SCANS.get(location, set()):
+                log.warning(f"Full table scan '{step}' at {location} (line {line})")
+                unexpected += 1
+
+    log.info(
+        f"Audited {audited} queries, found {unexpected} unexpected full scans "
+        "and failed queries"
+    )
+    return unexpected
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from ..database import db_interface as db
+
+log = logging.getLogger("lyrics")
+
+
+class CrawlCheckpoint:
+    """Buffers track_status transitions of a lyrics crawl and writes them to the db
+    in batches.
+
+    Every transition is appended to a journal file before it is buffered. The
+    journal is truncated once the buffer is committed to the db, so after a crash
+    the uncommitted transitions are replayed by recover() and the crawl resumes
+    without fetching these songs again.
+    """
+
+    def __init__(
+        self,
+        journal_path: Path,
+        cnx: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        flush_every: int = 500,
+        flush_interval: float = 30.0,
+    ):
+        """Opens the journal of the crawl.
+
+        Args:
+            journal_path (Path): path of the journal file
+            cnx (sqlite3.Connection): the connection to the db
+            cursor (sqlite3.Cursor): the cursor of the db
+            flush_every (int, optional): songs between flushes. Defaults to 500.
+            flush_interval (float, optional): seconds between flushes.
+                Defaults to 30.0.
+        """
+        self.journal_path = journal_path
+        self.cnx = cnx
+        self.cursor = cursor
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer: List[Tuple[int, int, int, str]] = []
+        self.last_flush = time.monotonic()
+
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.journal = open(journal_path, "a+", encoding="utf-8")
+
+    def recover(self) -> int:
+        """Writes transitions left in the journal by an interrupted crawl to the db.
+
+        Returns:
+            int: number of recovered transitions
+        """
+        self.journal.seek(0)
+
+        for line in self.journal:
+            try:
+                self.buffer.append(tuple(json.loads(line)))
+            except json.JSONDecodeError:
+                # last line may be incomplete if the crawl crashed while writing
+                log.warning(f"Ignoring incomplete journal entry: {line!r}")
+
+        recovered = len(self.buffer)
+        if recovered > 0:
+            log.info(f"Recovering {recovered} track statuses from journal")
+            self.flush()
+        return recovered
+
+    def record(self, song_id: str, lyrics_skipped: int = 0, lyrics_stored: int = 0):
+        """Records that a song has been crawled and flushes if due.
+
+        Args:
+            song_id (str): id of the song
+            lyrics_skipped (int, optional): 1 if lyrics were skipped. Defaults to 0.
+            lyrics_stored (int, optional): 1 if lyrics were stored. Defaults to 0.
+        """
+        transition = (2, lyrics_skipped, lyrics_stored, song_id)
+
+        self.journal.write(json.dumps(transition) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+        self.buffer.append(transition)
+
+        if (
+            len(self.buffer) >= self.flush_every
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Writes buffered transitions to the db and truncates the journal."""
+        if self.buffer:
+            db.update_track_status_bulk(self.buffer, self.cnx, self.cursor)
+            self.buffer = []
+
+        # transitions are committed, journal is not needed anymore
+        self.journal.seek(0)
+        self.journal.truncate()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Flushes remaining transitions and closes the journal."""
+        self.flush()
+        self.journal.close()
@@ -0,0 +1,273 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Optional, Tuple
+
+log = logging.getLogger("lyrics")
+
+CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS lyrics_cache
+    (
+        key TEXT NOT NULL,
+        lyrics TEXT,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (key)
+    );
+"""
+
+LANGUAGE_TABLE = """
+    CREATE TABLE IF NOT EXISTS language_verdicts
+    (
+        digest TEXT NOT NULL,
+        language TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (digest)
+    );
+"""
+
+CACHE_INDEX = """
+    CREATE INDEX IF NOT EXISTS lyrics_cache_accessed_at
+    ON lyrics_cache (accessed_at);
+"""
+
+LANGUAGE_INDEX = """
+    CREATE INDEX IF NOT EXISTS language_verdicts_accessed_at
+    ON language_verdicts (accessed_at);
+"""
+
+
+def cache_key(song_title: str, artist: str) -> str:
+    """Normalizes title and artist into a cache key, ignoring case, unicode
+    representation and whitespace.
+
+    Args:
+        song_title (str): the title of the song
+        artist (str): the artist of the song
+
+    Returns:
+        str: the cache key
+    """
+    parts = []
+    for part in (song_title, artist):
+        part = unicodedata.normalize("NFKC", str(part)).casefold()
+        parts.append(re.sub(r"\s+", " ", part).strip())
+    return "\x1f".join(parts)
+
+
+class LyricsCache:
+    """On-disk cache of Genius search results keyed by title and artist, and of
+    the detected language of lyrics keyed by their hash.
+
+    Songs that were not found are cached as well, so they are not searched again.
+    Entries expire after ttl seconds and the least recently used entries are
+    evicted once the cached lyrics exceed max_bytes or the languages exceed
+    max_verdicts.
+    """
+
+    def __init__(
+        self,
+        cache_path: Path,
+        ttl: float = 90 * 24 * 3600,
+        max_bytes: int = 2 * 1024 ** 3,
+        max_verdicts: int = 1000000,
+        evict_every: int = 1000,
+    ):
+        """Opens or creates the cache.
+
+        Args:
+            cache_path (Path): path of the cache db file
+            ttl (float, optional): seconds until entries expire. Defaults to 90 days.
+            max_bytes (int, optional): size budget of cached lyrics. Defaults to 2 GB.
+            max_verdicts (int, optional): number of cached languages.
+                Defaults to 1000000.
+            evict_every (int, optional): writes between evictions. Defaults to 1000.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_verdicts = max_verdicts
+        self.evict_every = evict_every
+        self.writes = 0
+        self.lock = threading.Lock()
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # shared by the fetching threads, access is serialized by the lock
+        self.cnx = sqlite3.connect(str(cache_path), check_same_thread=False)
+        self.cnx.execute("PRAGMA journal_mode = WAL;")
+        self.cnx.execute(CACHE_TABLE)
+        self.cnx.execute(CACHE_INDEX)
+
+        # languages of earlier versions have no timestamps, they are detected again
+        columns = [
+            c[1] for c in self.cnx.execute("PRAGMA table_info(language_verdicts);")
+        ]
+        if columns and "accessed_at" not in columns:
+            self.cnx.execute("DROP TABLE language_verdicts;")
+
+        self.cnx.execute(LANGUAGE_TABLE)
+        self.cnx.execute(LANGUAGE_INDEX)
+        self.cnx.commit()
+
+    def get(self, song_title: str, artist: str) -> Tuple[bool, Optional[str]]:
+        """Looks up the search result of a song.
+
+        Args:
+            song_title (str): the title of the song
+            artist (str): the artist of the song
+
+        Returns:
+            Tuple[bool, Optional[str]]: (hit, lyrics), lyrics are None for songs
+                that were not found
+        """
+        key = cache_key(song_title, artist)
+        now = time.time()
+
+        with self.lock:
+            row = self.cnx.execute(
+                "SELECT lyrics, created_at FROM lyrics_cache WHERE key == ?;", [key]
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                return (False, None)
+
+            self.cnx.execute(
+                "UPDATE lyrics_cache SET accessed_at = ? WHERE key == ?;", [now, key]
+            )
+            self.cnx.commit()
+
+        return (True, row[0])
+
+    def put(self, song_title: str, artist: str, lyrics: Optional[str]):
+        """Stores the search result of a song.
+
+        Args:
+            song_title (str): the title of the song
+            artist (str): the artist of the song
+            lyrics (Optional[str]): the lyrics or None if the song was not found
+        """
+        key = cache_key(song_title, artist)
+        size = len(lyrics.encode("utf-8")) if lyrics is not None else 0
+        now = time.time()
+
+        with self.lock:
+            self.cnx.execute(
+                "INSERT OR REPLACE INTO lyrics_cache VALUES (?, ?, ?, ?, ?);",
+                [key, lyrics, size, now, now],
+            )
+            self.cnx.commit()
+
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self.evict()
+
+    def get_language(self, digest: str) -> Optional[str]:
+        """Looks up the detected language of lyrics.
+
+        Args:
+            digest (str): hash of the lyrics
+
+        Returns:
+            Optional[str]: the language or None if not cached
+        """
+        now = time.time()
+
+        with self.lock:
+            row = self.cnx.execute(
+                "SELECT language, created_at FROM language_verdicts WHERE digest == ?;",
+                [digest],
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                return None
+
+            self.cnx.execute(
+                "UPDATE language_verdicts SET accessed_at = ? WHERE digest == ?;",
+                [now, digest],
+            )
+            self.cnx.commit()
+
+        return row[0]
+
+    def put_language(self, digest: str, language: str):
+        """Stores the detected language of lyrics.
+
+        Args:
+            digest (str): hash of the lyrics
+            language (str): the detected language
+        """
+        now = time.time()
+
+        with self.lock:
+            self.cnx.execute(
+                "INSERT OR REPLACE INTO language_verdicts VALUES (?, ?, ?, ?);",
+                [digest, language, now, now],
+            )
+            self.cnx.commit()
+
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self.evict()
+
+    def evict(self):
+        """Deletes expired entries and least recently used entries beyond the size
+        budget. Expects the lock to be held."""
+        now = time.time()
+        self.cnx.execute(
+            "DELETE FROM lyrics_cache WHERE created_at < ?;", [now - self.ttl]
+        )
+
+        total_size = self.cnx.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM lyrics_cache;"
+        ).fetchone()[0]
+
+        if total_size > self.max_bytes:
+            # walk entries from least recently used until enough space is freed
+            freed = 0
+            cutoff = None
+            for size, accessed_at in self.cnx.execute(
+                "SELECT size, accessed_at FROM lyrics_cache ORDER BY accessed_at;"
+            ):
+                freed += size
+                cutoff = accessed_at
+                if total_size - freed <= self.max_bytes:
+                    break
+
+            self.cnx.execute(
+                "DELETE FROM lyrics_cache WHERE accessed_at <= ?;", [cutoff]
+            )
+            log.info(f"Evicted {freed} bytes from lyrics cache")
+
+        self.cnx.execute(
+            "DELETE FROM language_verdicts WHERE created_at < ?;", [now - self.ttl]
+        )
+
+        # languages have about the same size, so their budget is a number of entries
+        evicted = self.cnx.execute(
+            """
+            DELETE FROM language_verdicts
+            WHERE accessed_at <= (
+                SELECT accessed_at
+                FROM language_verdicts
+                ORDER BY accessed_at DESC
+                LIMIT 1 OFFSET ?
+            );
+            """,
+            [self.max_verdicts],
+        ).rowcount
+        if evicted > 0:
+            log.info(f"Evicted {evicted} languages from lyrics cache")
+
+        self.cnx.commit()
+
+    def close(self):
+        """Evicts outdated entries and closes the cache."""
+        with self.lock:
+            self.evict()
+            self.cnx.close()
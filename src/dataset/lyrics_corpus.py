@@ -0,0 +1,174 @@
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+log = logging.getLogger("lyrics")
+
+
+class LyricsCorpus:
+    """Packed store of lyrics in a single append-only data file.
+
+    Lyrics are appended utf-8 encoded to the data file and their position is
+    appended as "song_id<TAB>offset<TAB>length" line to an index file next to it.
+    If a song is stored more than once, the last entry wins. Reading is done via
+    mmap, so lookups by song_id are random access and scans do not copy data.
+    """
+
+    def __init__(self, data_path: Path, writable: bool = False):
+        """Opens or creates the corpus.
+
+        Args:
+            data_path (Path): path of the data file, the index is stored at
+                data_path + ".idx"
+            writable (bool, optional): True to append lyrics. Defaults to False.
+        """
+        self.data_path = data_path
+        self.index_path = data_path.with_name(data_path.name + ".idx")
+        self.writable = writable
+        self.mapping = None
+        self.index: Dict[str, Tuple[int, int]] = {}
+
+        if writable:
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            self.data = open(data_path, "ab+")
+            self.index_file = open(self.index_path, "a+b")
+        else:
+            self.data = open(data_path, "rb")
+            self.index_file = None
+
+        self.load_index()
+
+    def load_index(self):
+        """Reads the index file into memory, ignoring incomplete entries of an
+        interrupted write."""
+        if not self.index_path.exists():
+            return
+
+        with open(self.index_path, "rb") as index_file:
+            content = index_file.read()
+
+        # drop a partially written last line, so new entries start on a new line
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content) and self.writable:
+            log.warning(f"Truncating incomplete entry of {self.index_path}")
+            self.index_file.truncate(complete)
+
+        data_size = os.path.getsize(self.data_path)
+        for line in content[:complete].splitlines():
+            try:
+                song_id, offset, length = line.decode("utf-8").split("\t")
+                offset, length = int(offset), int(length)
+            except ValueError:
+                log.warning(f"Ignoring invalid corpus index entry {line!r}")
+                continue
+
+            if offset + length <= data_size:
+                self.index[song_id] = (offset, length)
+
+    def append(self, song_id: str, lyrics: str):
+        """Appends the lyrics of a song to the corpus.
+
+        Args:
+            song_id (str): id of the song
+            lyrics (str): lyrics of the song
+        """
+        if not self.writable:
+            raise ValueError("Corpus opened read-only")
+
+        encoded = lyrics.encode("utf-8")
+        offset = self.data.seek(0, os.SEEK_END)
+        self.data.write(encoded)
+        self.data.flush()
+
+        # index entry is written after the data, so it never points to missing data
+        self.index_file.write(f"{song_id}\t{offset}\t{len(encoded)}\n".encode("utf-8"))
+        self.index_file.flush()
+
+        self.index[song_id] = (offset, len(encoded))
+
+    def view(self, offset: int, length: int) -> memoryview:
+        """Returns a zero-copy view on a range of the data file.
+
+        Args:
+            offset (int): start of the range
+            length (int): length of the range
+
+        Returns:
+            memoryview: view on the mapped data file
+        """
+        if self.mapping is None or offset + length > len(self.mapping):
+            # map again after the file has grown, old views keep the old mapping
+            self.mapping = mmap.mmap(self.data.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mapping)[offset : offset + length]
+
+    def get(self, song_id: str) -> str:
+        """Gets the lyrics of a song.
+
+        Args:
+            song_id (str): id of the song
+
+        Raises:
+            KeyError: song is not in the corpus
+
+        Returns:
+            str: lyrics of the song
+        """
+        offset, length = self.index[song_id]
+        if length == 0:
+            return ""
+        return str(self.view(offset, length), "utf-8")
+
+    def scan(self) -> Iterator[Tuple[str, memoryview]]:
+        """Iterates over all songs in order of the data file.
+
+        Yields:
+            Tuple[str, memoryview]: (song_id, utf-8 encoded lyrics), the view is
+                only valid while the corpus is open
+        """
+        for song_id, (offset, length) in sorted(
+            self.index.items(), key=lambda entry: entry[1][0]
+        ):
+            yield song_id, self.view(offset, length) if length else memoryview(b"")
+
+    def __contains__(self, song_id: str) -> bool:
+        return song_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self):
+        """Closes the data and index files."""
+        self.mapping = None
+        self.data.close()
+        if self.index_file is not None:
+            self.index_file.close()
+
+
+def migrate_lyrics_txt(corpus: LyricsCorpus, lyrics_dir: Path) -> int:
+    """Appends lyrics of all .txt files in a directory to the corpus, the file
+    name is the song_id. Songs already in the corpus are skipped.
+
+    Args:
+        corpus (LyricsCorpus): writable corpus
+        lyrics_dir (Path): directory of .txt lyrics files
+
+    Returns:
+        int: number of migrated songs
+    """
+    migrated = 0
+
+    for lyrics_file in lyrics_dir.glob("*.txt"):
+        song_id = lyrics_file.stem
+        if song_id in corpus:
+            continue
+
+        corpus.append(song_id, lyrics_file.read_text(encoding="utf-8"))
+        migrated += 1
+
+        if migrated % 10000 == 0:
+            log.info(f"Migrated {migrated} lyrics files")
+
+    log.info(f"Migrated {migrated} lyrics files into {corpus.data_path}")
+    return migrated
@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+log = logging.getLogger("lyrics")
+
+# marks the end of the song stream in the queues
+DONE = object()
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """Creates a full bucket.
+
+        Args:
+            rate (float): tokens added per second
+            capacity (float, optional): maximum tokens. Defaults to rate.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_with_retry(
+    fetch: Callable[[str, str], Optional[str]],
+    song: Tuple[str, str, str],
+    bucket: TokenBucket = None,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> Tuple[Optional[str], Optional[Exception]]:
+    """Fetches the lyrics of a song, retrying failed requests with exponential
+    backoff.
+
+    Args:
+        fetch (Callable[[str, str], Optional[str]]): gets lyrics for (title, artist),
+            returns None if the song was not found and raises on request errors
+        song (Tuple[str, str, str]): (song_id, song_name, song_artist)
+        bucket (TokenBucket, optional): rate limit for requests. Defaults to None.
+        max_retries (int, optional): retries after the first attempt. Defaults to 3.
+        backoff (float, optional): seconds to wait before first retry. Defaults to 1.0.
+
+    Returns:
+        Tuple[Optional[str], Optional[Exception]]: (lyrics, last error)
+    """
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+
+        try:
+            return fetch(song[1], song[2]), None
+        except Exception as err:
+            if attempt == max_retries:
+                return None, err
+
+            log.warning(
+                f"Failed fetching song {song[1]} (attempt {attempt + 1}): {err}"
+            )
+            time.sleep(backoff * 2 ** attempt)
+
+
+def put_until_stopped(target: queue.Queue, item, stop: threading.Event) -> bool:
+    """Puts an item into a bounded queue unless stop is set while waiting.
+
+    Returns:
+        bool: True if the item was put into the queue
+    """
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def fetch_lyrics_concurrently(
+    songs: Iterable[Tuple[str, str, str]],
+    fetch: Callable[[str, str], Optional[str]],
+    workers: int = 8,
+    rate: float = 5.0,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    max_in_flight: int = None,
+) -> Iterator[Tuple[Tuple[str, str, str], Optional[str], Optional[Exception]]]:
+    """Fetches lyrics for songs on a pool of threads and yields the results in
+    order of completion.
+
+    Results are consumed by the caller, which is therefore the single writer of
+    the results. At most max_in_flight songs are queued or fetched at a time, so
+    a slow consumer throttles the fetchers.
+
+    Args:
+        songs (Iterable[Tuple[str, str, str]]): (song_id, song_name, song_artist)
+        fetch (Callable[[str, str], Optional[str]]): gets lyrics for (title, artist),
+            returns None if the song was not found and raises on request errors
+        workers (int, optional): number of fetching threads. Defaults to 8.
+        rate (float, optional): maximum requests per second. Defaults to 5.0.
+        max_retries (int, optional): retries per song. Defaults to 3.
+        backoff (float, optional): seconds to wait before first retry. Defaults to 1.0.
+        max_in_flight (int, optional): bound of both queues. Defaults to 2 * workers.
+
+    Yields:
+        Tuple[Tuple[str, str, str], Optional[str], Optional[Exception]]:
+            (song, lyrics, error) for every song
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    songs_queue = queue.Queue(maxsize=max_in_flight)
+    results_queue = queue.Queue(maxsize=max_in_flight)
+    bucket = TokenBucket(rate)
+    stop = threading.Event()
+
+    def feed():
+        try:
+            for song in songs:
+                if not put_until_stopped(songs_queue, song, stop):
+                    return
+        finally:
+            for _ in range(workers):
+                put_until_stopped(songs_queue, DONE, stop)
+
+    def work():
+        while not stop.is_set():
+            try:
+                song = songs_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if song is DONE:
+                put_until_stopped(results_queue, DONE, stop)
+                return
+
+            lyrics, err = fetch_with_retry(fetch, song, bucket, max_retries, backoff)
+            put_until_stopped(results_queue, (song, lyrics, err), stop)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    finished_workers = 0
+    try:
+        while finished_workers < workers:
+            result = results_queue.get()
+            if result is DONE:
+                finished_workers += 1
+            else:
+                yield result
+    finally:
+        # also stops the threads if the consumer exits early
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -3,7 +3,7 @@ import logging
 import logging.config
 import os
 import sqlite3
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import signal
 import sys
@@ -12,7 +12,12 @@ import lyricsgenius as api
 from pathlib import Path
 
 from ..database import db_interface as db
-from ..dataset.preprocessing import content_is_lyrics, valid_lyrics, clean_lyrics
+from ..dataset import preprocessing
+from ..dataset.preprocessing import normalize_lyrics, valid_lyrics
+from .crawl_checkpoint import CrawlCheckpoint
+from .lyrics_cache import LyricsCache
+from .lyrics_corpus import LyricsCorpus, migrate_lyrics_txt
+from .lyrics_fetcher import fetch_lyrics_concurrently, fetch_with_retry
 
 
 from dotenv import load_dotenv
@@ -20,10 +25,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LYRICS_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "lyrics"
+LYRICS_CACHE_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "lyrics_cache.db"
+LYRICS_CORPUS_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "lyrics.pack"
+CRAWL_JOURNAL_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "crawl_journal.jsonl"
 
 log = logging.getLogger("lyrics")
 
 genius = None
+lyrics_cache = None
+lyrics_corpus = None
 lyrics_dict = {}
 
 
@@ -40,6 +50,53 @@ def connect_to_api() -> None:
     log.info("Connected to Genius API")
 
 
+def open_lyrics_cache() -> None:
+    """Open the on-disk cache of Genius search results."""
+    global lyrics_cache
+    lyrics_cache = LyricsCache(LYRICS_CACHE_PATH)
+    preprocessing.language_cache = lyrics_cache
+    log.info(f"Opened lyrics cache at {LYRICS_CACHE_PATH}")
+
+
+def close_lyrics_cache() -> None:
+    """Close the on-disk cache of Genius search results, if opened."""
+    global lyrics_cache
+    if lyrics_cache is not None:
+        lyrics_cache.close()
+        lyrics_cache = None
+        preprocessing.language_cache = None
+
+
+def open_lyrics_corpus(writable: bool = False) -> None:
+    """Open the packed lyrics corpus.
+
+    Args:
+        writable (bool, optional): True to store lyrics. Defaults to False.
+    """
+    global lyrics_corpus
+    if lyrics_corpus is not None:
+        lyrics_corpus.close()
+    lyrics_corpus = LyricsCorpus(LYRICS_CORPUS_PATH, writable)
+    log.info(f"Opened lyrics corpus with {len(lyrics_corpus)} songs")
+
+
+def close_lyrics_corpus() -> None:
+    """Close the packed lyrics corpus, if opened."""
+    global lyrics_corpus
+    if lyrics_corpus is not None:
+        lyrics_corpus.close()
+        lyrics_corpus = None
+
+
+def migrate_lyrics_to_corpus() -> None:
+    """Copy lyrics stored as .txt files into the packed lyrics corpus."""
+    open_lyrics_corpus(writable=True)
+    try:
+        migrate_lyrics_txt(lyrics_corpus, LYRICS_PATH)
+    finally:
+        close_lyrics_corpus()
+
+
 def get_song_lyrics(song_title: str, artist: str) -> str:
     """Gets the lyrics of the specified song fo the specified artist.
 
@@ -53,19 +110,44 @@ def get_song_lyrics(song_title: str, artist: str) -> str:
     Returns:
         lyrics (str): the lyrics of the song
     """
-    # get song object from genius
+    # get lyrics from cache or genius
     try:
-        song = genius.search_song(song_title, artist)
+        lyrics = search_song_lyrics(song_title, artist)
     except Exception as err:
         log.warning(f"Failed getting object for song {song_title}: {err}")
         raise err
 
-    # get lyrics from song object
-    try:
-        lyrics = song.lyrics
-    except Exception as err:
-        log.warning(f"Failed getting lyrics for song {song_title}: {err}")
-        raise err
+    if lyrics is None:
+        log.warning(f"Failed getting lyrics for song {song_title}: song not found")
+        raise Exception(f"No lyrics found for song {song_title}")
+    return lyrics
+
+
+def search_song_lyrics(song_title: str, artist: str) -> Optional[str]:
+    """Gets the lyrics of the specified song fo the specified artist, if found.
+    Results are looked up in and added to the lyrics cache, if opened.
+
+    Args:
+        song_title (str): the title of the song
+        artist (str): the artist of the song
+
+    Raises:
+        Exception: request to the api failed
+
+    Returns:
+        Optional[str]: the lyrics of the song or None if not found
+    """
+    if lyrics_cache is not None:
+        hit, lyrics = lyrics_cache.get(song_title, artist)
+        if hit:
+            return lyrics
+
+    song = genius.search_song(song_title, artist)
+    lyrics = song.lyrics if song is not None else None
+
+    # failed requests raised above and are not cached
+    if lyrics_cache is not None:
+        lyrics_cache.put(song_title, artist, lyrics)
     return lyrics
 
 
@@ -95,9 +177,7 @@ def lyrics_dict_to_json(file_name: str) -> None:
         return
 
     # path to target json
-    lyrics_json_path = (
-        os.getenv("DATA_PATH") + "\\datasets\\lyrics\\lyrics_" + file_name + ".json"
-    )
+    lyrics_json_path = LYRICS_PATH / f"lyrics_{file_name}.json"
 
     if not os.path.exists(os.path.dirname(lyrics_json_path)):
         os.makedirs(os.path.dirname(lyrics_json_path))
@@ -120,21 +200,24 @@ def store_lyrics_to_txt(song_id: str, lyrics: str):
     """
 
     # This lyrics path does not exist, only non-stored songs searched
-    lyrics_path = os.getenv("DATA_PATH") + "\\datasets\\lyrics\\" + song_id + ".txt"
+    lyrics_path = LYRICS_PATH / f"{song_id}.txt"
 
-    # write lyrics into file
-    with open(lyrics_path, "a", encoding="utf-8") as file:
+    # overwrite lyrics of a song stored again after an interrupted crawl
+    with open(lyrics_path, "w", encoding="utf-8") as file:
         file.write(lyrics)
 
     # log.info(f"Stored lyrics of song_id {song_id}")
 
 
-def get_song_list(cnx: sqlite3.Connection, cursor: sqlite3.Cursor) -> List[List[str]]:
+def get_song_list(
+    cnx: sqlite3.Connection, cursor: sqlite3.Cursor, limit: int = 1000
+) -> List[List[str]]:
     """Query db and return for list of (song_id, song_name, song_artist) tuples.
 
     Args:
         cnx (sqlite3.Connection): the connection to the db
         cursor (sqlite3.Cursor): the cursor of the db
+        limit (int, optional): maximum number of songs, -1 for all. Defaults to 1000.
 
     Raises:
         Error: unknown error during sql query execution
@@ -162,12 +245,12 @@ def get_song_list(cnx: sqlite3.Connection, cursor: sqlite3.Cursor) -> List[List[
             AND ts.lyrics_stored == 0
             AND t.release_year >= 2000
             AND 20 <= t.popularity AND t.popularity < 40
-            LIMIT 1000
+            LIMIT ?
     )
     """
 
     try:
-        cursor.execute(query)
+        cursor.execute(query, [limit])
         results = cursor.fetchall()
     except sqlite3.Error as err:
         log.error(f"Failed to query all songs in table tracks: {err}")
@@ -208,48 +291,88 @@ def get_unscored_songs(cnx: sqlite3.Connection, cursor: sqlite3.Cursor) -> List[
     return results
 
 
-def run_lyrics_getter() -> None:
-    """Get lyrics for all tracks in spotfiy_ds and store them in .txt file."""
+def run_lyrics_getter(
+    workers: int = 1,
+    limit: int = 1000,
+    rate: float = 5.0,
+    flush_every: int = 500,
+    flush_interval: float = 30.0,
+) -> None:
+    """Get lyrics for all tracks in spotfiy_ds and store them in the lyrics corpus.
+
+    Status updates are journaled and written to the db in batches. An interrupted
+    crawl is recovered from the journal on the next run.
+
+    Args:
+        workers (int, optional): number of threads fetching lyrics. Defaults to 1.
+        limit (int, optional): maximum number of songs, -1 for all. Defaults to 1000.
+        rate (float, optional): maximum api requests per second. Defaults to 5.0.
+        flush_every (int, optional): songs between status writes. Defaults to 500.
+        flush_interval (float, optional): seconds between status writes.
+            Defaults to 30.0.
+    """
 
     connect_to_api()
+    open_lyrics_cache()
+    open_lyrics_corpus(writable=True)
     cnx, cursor = db.connect_to_db("spotify_ds")
 
+    checkpoint = CrawlCheckpoint(
+        CRAWL_JOURNAL_PATH, cnx, cursor, flush_every, flush_interval
+    )
+    checkpoint.recover()
+
     # query db to get list of all (song_id, song_name, artist) tuples
-    song_list = get_song_list(cnx, cursor)
+    song_list = get_song_list(cnx, cursor, limit)
     len_songs = len(song_list)
 
-    for i in range(0, len(song_list)):
+    if workers > 1:
+        results = fetch_lyrics_concurrently(
+            song_list, search_song_lyrics, workers=workers, rate=rate
+        )
+    else:
+        results = (
+            (song, *fetch_with_retry(search_song_lyrics, song)) for song in song_list
+        )
+
+    # results are written on this thread only
+    try:
+        for i, (song, lyrics, err) in enumerate(results):
 
-        if i % 100 == 0:
-            log.info(f"Song: {i}/{len_songs}")
+            if i % 100 == 0:
+                log.info(f"Song: {i}/{len_songs}")
 
-        # for every new song update gen to 2
-        db.update_generation(cnx, cursor, song_list[i][0], 2)
+            if lyrics is None:
+                log.warning(f"Skipping song {song[1]}, no lyrics found: {err}")
+                checkpoint.record(song[0], lyrics_skipped=1)
+                continue
 
-        try:
-            lyrics = get_song_lyrics(song_list[i][1], song_list[i][2])
-        except Exception:
-            log.warning(f"Skipping song {song_list[i][1]}, no lyrics found.")
-            db.update_song_status(cnx, cursor, song_list[i][0], lyrics_skipped=1)
-            continue
+            # clean and check lines in one pass before the language is detected
+            cleaned_lyrics, is_lyrics = normalize_lyrics(lyrics)
 
-        if not valid_lyrics(lyrics):
-            log.warning(f"Skipping song {song_list[i][1]}: invalid lyrics")
-            db.update_song_status(cnx, cursor, song_list[i][0], lyrics_skipped=1)
-            continue
+            if not valid_lyrics(lyrics, is_lyrics):
+                log.warning(f"Skipping song {song[1]}: invalid lyrics")
+                checkpoint.record(song[0], lyrics_skipped=1)
+                continue
 
-        lyrics = clean_lyrics(lyrics)
+            lyrics = cleaned_lyrics
 
-        log.info(f"Store lyrics for song_id {song_list[i][0]} ({song_list[i][1]}).")
+            log.info(f"Store lyrics for song_id {song[0]} ({song[1]}).")
 
-        store_lyrics_to_txt(song_list[i][0], lyrics)
-        db.update_song_status(cnx, cursor, song_list[i][0], lyrics_stored=1)
+            # lyrics are stored before the status is recorded
+            lyrics_corpus.append(song[0], lyrics)
+            checkpoint.record(song[0], lyrics_stored=1)
+    finally:
+        checkpoint.close()
+        close_lyrics_cache()
+        close_lyrics_corpus()
 
     log.info("Finished lyrics scraping.")
 
 
 def get_lyrics_from_file(song_id: str) -> str:
-    """Get lyrics for song_id from dataset folder.
+    """Get lyrics for song_id from the lyrics corpus or the .txt file in the
+    dataset folder, if not in the corpus.
 
     Args:
         song_id (str): id of the song
@@ -260,6 +383,12 @@ def get_lyrics_from_file(song_id: str) -> str:
     Returns:
         (str): lyrics of song
     """
+    if lyrics_corpus is None and LYRICS_CORPUS_PATH.exists():
+        open_lyrics_corpus()
+
+    if lyrics_corpus is not None and song_id in lyrics_corpus:
+        return lyrics_corpus.get(song_id)
+
     lyrics_file_path = LYRICS_PATH / (song_id + ".txt")
 
     with open(lyrics_file_path, "r", encoding="utf-8") as f:
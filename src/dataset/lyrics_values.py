@@ -1,13 +1,30 @@
 import logging
-from typing import List
+import time
+from collections import Counter
+from itertools import chain
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
 
 from ..database import db_interface as db
+from .preprocessing import normalize_lyrics_batch
 from .lyrics_getter import get_lyrics_from_file, get_unscored_songs
 
 log = logging.getLogger("lyrics")
 
+# songs read and scored together by one process
+SCORE_BATCH_SIZE = 64
 
-def run_lyrics_scorer():
+# characters separating words in addition to spaces
+WORD_SEPARATORS = str.maketrans({",": " ", "(": " ", ")": " ", "\n": " "})
+
+
+def run_lyrics_scorer(workers: int = 1, chunk_size: int = 1000):
+    """Scores the lyrics of all unscored songs and stores the scores in the db.
+
+    Args:
+        workers (int, optional): number of scoring processes. Defaults to 1.
+        chunk_size (int, optional): songs per db transaction. Defaults to 1000.
+    """
     log.info("Running lyrics scorer...")
 
     cnx, cursor = db.connect_to_db("spotify_ds")
@@ -16,43 +33,111 @@ def run_lyrics_scorer():
     log.info(f"Attempting to get lyrics for {len(song_list)} songs")
     skipped_songs = []
     processed_songs = 0
+    chunk = []
+    start = time.perf_counter()
+
+    # songs are read, normalized and scored in batches
+    batches = [
+        song_list[i : i + SCORE_BATCH_SIZE]
+        for i in range(0, len(song_list), SCORE_BATCH_SIZE)
+    ]
+
+    if workers > 1:
+        pool = Pool(workers)
+        results = pool.imap(score_songs, batches)
+    else:
+        pool = None
+        results = map(score_songs, batches)
+
+    try:
+        for song_id, lyric_scores in chain.from_iterable(results):
+            processed_songs += 1
+
+            if lyric_scores is None:
+                skipped_songs.append(song_id)
+            else:
+                chunk.append([song_id] + lyric_scores)
+
+            if len(chunk) >= chunk_size or processed_songs == len(song_list):
+                write_lyric_scores(chunk, skipped_songs, cnx, cursor)
+                chunk = []
+
+                elapsed = time.perf_counter() - start
+                log.info(
+                    f"Song: {processed_songs}/{len(song_list)} "
+                    f"({processed_songs / elapsed:.1f} songs/sec)"
+                )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    log.info(
+        f"Skipped {len(skipped_songs)} out of {len(song_list)} songs: {skipped_songs}"
+    )
+    log.info("Lyrics scorer completed")
 
-    for song_id in song_list:
-        processed_songs += 1
-        if processed_songs % 100 == 0:
-            log.info(f"Song: {processed_songs}/{len(song_list)}")
 
+def score_songs(song_ids: List[str]) -> List[Tuple[str, Optional[List[float]]]]:
+    """Reads, normalizes and scores the lyrics of a batch of songs.
+
+    Args:
+        song_ids (List[str]): ids of the songs
+
+    Returns:
+        List[Tuple[str, Optional[List[float]]]]: (song_id, scores) for each song,
+            scores are None if the song was skipped
+    """
+    found_ids = []
+    lyrics_list = []
+    results = []
+
+    for song_id in song_ids:
         try:
-            lyrics = get_lyrics_from_file(song_id)
+            lyrics_list.append(get_lyrics_from_file(song_id))
+            found_ids.append(song_id)
         except Exception as err:
             log.error(f"Failed getting lyrics file for song {song_id}: {err}")
             log.info(f"Skipping lyrics for song {song_id}")
-            skipped_songs.append(song_id)
-            continue
+            results.append((song_id, None))
 
+    for song_id, (lyrics, _) in zip(found_ids, normalize_lyrics_batch(lyrics_list)):
         try:
             lyric_scores = score_lyrics(lyrics)
         except Exception as err:
-            log.error(f"Failed inserting lyrics scores for song {song_id}: {err}")
-            skipped_songs.append(song_id)
-            continue
+            log.error(f"Failed scoring lyrics for song {song_id}: {err}")
+            lyric_scores = None
 
         if lyric_scores is None:
             log.info(f"Skipping empty lyrics for song {song_id}")
-            skipped_songs.append(song_id)
-            continue
+        results.append((song_id, lyric_scores))
+
+    return results
+
+
+def write_lyric_scores(chunk: List[List], skipped_songs: List[str], cnx, cursor):
+    """Writes a chunk of lyric scores, falling back to single inserts if the chunk
+    fails to find the failing songs.
 
+    Args:
+        chunk (List[List]): (song_id, word_count, rep_score, div_score) rows in the
+            order of score_lyrics
+        skipped_songs (List[str]): skipped song ids, failing songs are appended
+        cnx (sqlite3.Connection): the connection to the db
+        cursor (sqlite3.Cursor): the cursor of the db
+    """
+    try:
+        db.insert_lyric_scores_bulk(chunk, cnx, cursor)
+        return
+    except Exception as err:
+        log.warning(f"Failed inserting chunk of lyrics scores, retrying: {err}")
+
+    for row in chunk:
         try:
-            db.insert_lyric_scores(song_id, lyric_scores, cnx, cursor)
+            db.insert_lyric_scores(row[0], row[1:], cnx, cursor)
         except Exception as err:
-            log.error(f"Failed inserting lyrics scores for song {song_id}: {err}")
-            skipped_songs.append(song_id)
-            continue
-
-    log.info(
-        f"Skipped {len(skipped_songs)} out of {len(song_list)} songs: {skipped_songs}"
-    )
-    log.info("Lyrics scorer completed")
+            log.error(f"Failed inserting lyrics scores for song {row[0]}: {err}")
+            skipped_songs.append(row[0])
 
 
 def score_lyrics(lyrics: str) -> List[float]:
@@ -68,32 +153,35 @@ def score_lyrics(lyrics: str) -> List[float]:
         log.error("Lyrics not of type string, skipping")
         return
 
-    lyrics = (
-        lyrics.replace(",", " ")
-        .replace("(", " ")
-        .replace(")", " ")
-        .replace("\n", " ")
-        .lower()
-    )
-
-    lyrics_split = list(filter(None, lyrics.split(" ")))
+    word_counts = count_words(lyrics)
 
-    if not lyrics_split:
+    if not word_counts:
         log.warning("Empty list, skipping lyrics")
         return
 
-    word_count = len(lyrics_split)
-    # print("word_count()=", word_count)
+    word_count = sum(word_counts.values())
 
-    rep_score = repetition_score(lyrics_split)
-    # print("repetition_score()=", rep_score)
+    # words occuring more than once, counted with all occurences
+    rep_score = sum(n for n in word_counts.values() if n > 1) / word_count
 
-    div_score = diversity_score(lyrics_split)
-    # print("diversity_score()=", div_score)
+    div_score = len(word_counts) / word_count
 
     return [word_count, rep_score, div_score]
 
 
+def count_words(lyrics: str) -> Counter:
+    """Splits lyrics into lower case words and counts their occurences in one pass.
+
+    Args:
+        lyrics (str): the given lyrics
+
+    Returns:
+        Counter: occurences per word
+    """
+    words = lyrics.translate(WORD_SEPARATORS).lower().split(" ")
+    return Counter(filter(None, words))
+
+
 def repetition_score(lyrics_split: List[str]) -> float:
     """Computes the reptition score for a given lyrics.
 
@@ -103,9 +191,7 @@ def repetition_score(lyrics_split: List[str]) -> float:
     Returns:
         float: repetition score in [0,1]
     """
-    return sum(
-        [n for n in [lyrics_split.count(x) for x in set(lyrics_split)] if n > 1]
-    ) / len(lyrics_split)
+    return sum(n for n in Counter(lyrics_split).values() if n > 1) / len(lyrics_split)
 
 
 def diversity_score(lyrics_split: List[str]) -> float:
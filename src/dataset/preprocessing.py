@@ -1,14 +1,61 @@
+import hashlib
 import logging
 import re
 import logging
-from langdetect import detect
+import threading
+from collections import OrderedDict, deque
+from itertools import groupby, islice
+from multiprocessing import Pool
+import pandas as pd
+from langdetect import DetectorFactory, detect
 
 from ..database import db_interface as db
 
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 log = logging.getLogger("preprocessing")
 
+# below this many tracks, pairwise comparison is faster than building an index
+INDEXED_GROUPING_MIN_TRACKS = 200
+
+# number of artists handed to the filter processes at once
+FILTER_BATCH_SIZE = 10000
+
+# make langdetect deterministic between runs
+DetectorFactory.seed = 0
+
+# frequent english words that are rare in other languages
+# fmt: off
+ENGLISH_STOPWORDS = frozenset(
+    [
+        "the", "and", "you", "to", "it", "that", "is", "my", "your", "of", "with",
+        "for", "this", "be", "are", "was", "all", "what", "just", "don't", "can't",
+        "i'm", "it's", "you're", "know", "when", "we", "they", "but", "got", "get",
+        "want", "never", "can", "now", "she", "he", "her", "him", "like", "how",
+        "will", "have", "do", "up", "out", "if", "one", "been", "from", "our",
+    ]
+)
+# fmt: on
+
+# section tags like [Chorus] or [Verse 1: Artist] in lyrics from Genius
+SECTION_TAG_PATTERN = re.compile(r"\[[^\[\]\n]*\]")
+
+# first id of an artists_id list like ['id1', 'id2']
+FIRST_ARTIST_PATTERN = re.compile(r"^\['?([^',\]]*)")
+
+# number of characters inspected by the language heuristic
+LANGUAGE_PREFIX_LENGTH = 2000
+
+# number of language verdicts kept in memory, older ones are in language_cache
+LANGUAGE_VERDICTS_SIZE = 10000
+
+# recent language verdicts by sha1 of the lyrics, least recently used first
+language_verdicts: "OrderedDict[str, str]" = OrderedDict()
+language_verdicts_lock = threading.Lock()
+
+# optional persistent store of verdicts with get_language and put_language
+language_cache = None
+
 
 def process_track_row(track_row: List[str]) -> Optional[List[str]]:
     """Processes a row from tracks.csv for inserting it as a track into the db.
@@ -60,66 +107,258 @@ def process_artist_row(artist_row: List[str]) -> Optional[Tuple[List[str], List[
     return (artist_row, genres)
 
 
-def filter_tracks():
-    """Filter tracks from db.tracks table and add them to track_status table."""
-    cnx, cursor = db.connect_to_db("spotify_ds")
+def process_tracks_frame(tracks: pd.DataFrame) -> pd.DataFrame:
+    """Processes a chunk of tracks.csv like process_track_row, but on whole
+    columns instead of row by row.
 
-    # Get list of artists with modern songs
-    artists_query = """
-        SELECT DISTINCT artists.id
-        FROM artists 
-        INNER JOIN tracks ON artists.id == tracks.primary_artist_id
-        WHERE tracks.release_year >= 2000;
+    Args:
+        tracks (pd.DataFrame): the chunk of tracks.csv
+
+    Returns:
+        pd.DataFrame: the processed tracks in the column order of the tracks table
     """
+    # remove artists list
+    tracks = tracks.drop(columns=tracks.columns[5])
+
+    # set primary_artist_id to first from artists_id list
+    tracks.iloc[:, 5] = tracks.iloc[:, 5].str.extract(
+        FIRST_ARTIST_PATTERN, expand=False
+    )
+
+    # extract release year from date with format (YYYY-MM-DD) to (YYYY)
+    tracks.iloc[:, 6] = tracks.iloc[:, 6].str.slice(0, 4)
+
+    return tracks
+
+
+def process_artists_frame(
+    artists: pd.DataFrame,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Processes a chunk of artists.csv like process_artist_row, but on whole
+    columns instead of row by row.
+
+    Args:
+        artists (pd.DataFrame): the chunk of artists.csv
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (processed artists in the column order
+            of the artists table, (artist_id, genre) pairs)
+    """
+    # one row per genre of an artist, the index points to the artist
+    genres = artists.iloc[:, 2].str.slice(1, -1).str.split(",").explode()
+    genres = (
+        genres.str.replace("'", "", regex=False)
+        .str.replace('"', "", regex=False)
+        .str.strip()
+    )
+    genres = genres[genres.notna() & (genres != "")]
+
+    artist_genres = pd.DataFrame(
+        {"artist_id": artists.iloc[:, 0].loc[genres.index], "genre": genres}
+    )
+
+    # remove genres from rows
+    return (artists.drop(columns=artists.columns[2]), artist_genres)
 
+
+def filter_tracks(workers: int = 1):
+    """Filter tracks from db.tracks table and add them to track_status table.
+
+    All tracks released since 2000 are streamed in one query ordered by artist,
+    deduplicated per artist and the statuses are written in one transaction.
+
+    Args:
+        workers (int, optional): number of processes filtering artists in
+            parallel. Defaults to 1.
+    """
+    cnx, cursor = db.connect_to_db("spotify_ds")
+
+    # Songs of artists with modern songs, grouped by artist
     song_query = """
-        SELECT *
-        FROM tracks
-        WHERE tracks.release_year >= 2000
-        AND tracks.primary_artist_id == (?)
-        ORDER BY LENGTH(tracks.name) ASC;
+        SELECT t.*
+        FROM tracks AS t
+        WHERE t.release_year >= 2000
+        AND t.primary_artist_id IN (SELECT id FROM artists)
+        ORDER BY t.primary_artist_id, LENGTH(t.name) ASC, t.rowid;
     """
 
-    cursor.execute(artists_query)
-    artist_id_list = cursor.fetchall()
-    len_artists = len(artist_id_list)
-    print("Length artists ", len_artists)
+    cursor.execute(song_query)
+    artist_song_lists = (
+        list(song_list) for _, song_list in groupby(cursor, key=lambda song: song[5])
+    )
+
+    statuses = []
+    processed_artists = 0
+
+    # Artists are read in batches on this thread, as the cursor is not shareable
+    pool = Pool(workers) if workers > 1 else None
+
+    try:
+        while True:
+            batch = list(islice(artist_song_lists, FILTER_BATCH_SIZE))
+            if not batch:
+                break
+
+            # Filter similar songs per artist, keep highest popularity
+            if pool is not None:
+                distinct_song_lists = pool.map(
+                    filter_similar_song_names, batch, chunksize=64
+                )
+            else:
+                distinct_song_lists = map(filter_similar_song_names, batch)
+
+            for distinct_songs in distinct_song_lists:
+                statuses.extend([d[0], 1, 0, 0] for d in distinct_songs)
+
+            processed_artists += len(batch)
+            log.info(f"Processed artists: {processed_artists}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-    # For every artist that has released after 2000...
-    for i in range(0, len_artists):
-        # ... get song list with artist id
-        cursor.execute(song_query, artist_id_list[i])
-        song_name_list = cursor.fetchall()
+    # Add most popular distinct songs into new table
+    db.insert_song_status_bulk(statuses, cnx, cursor)
 
-        # Filter similar songs, keep highest popularity
-        distinct_songs = filter_similar_song_names(song_name_list)
+    log.info(f"Finished processing {processed_artists} artists.")
 
-        # [print(s[:3]) for s in song_name_list]
-        # print("Filtered list")
-        # [print(d[:3]) for d in distinct_songs]
-        # print()
-        # print()
 
-        # Add most popular distinct songs into new table
-        for d in distinct_songs:
-            try:
-                # insert into filter table
-                db.insert_song_status([d[0], 1, 0, 0], cnx, cursor)
-            except Exception as err:
-                log.warning(f"Skipping track with id {d[0]} due to error: {err}")
+def build_substring_index(
+    patterns: List[str],
+) -> Tuple[List[Dict[str, int]], List[int], List[int], List[int]]:
+    """Builds an Aho-Corasick automaton over the given patterns.
 
-        # Info every 100 artists
-        if i % 100 == 0:
-            print(f"Processed artists: {i}/{len(artist_id_list)}")
-            log.info(f"Processed artists: {i}/{len(artist_id_list)}")
+    Args:
+        patterns (List[str]): distinct non-empty patterns
+
+    Returns:
+        Tuple[List[Dict[str, int]], List[int], List[int], List[int]]:
+            (goto transitions, failure links, pattern id per state or -1,
+            dictionary suffix links to the next state with a pattern or -1)
+    """
+    goto = [{}]
+    terminal = [-1]
+
+    # insert every pattern into the trie
+    for pattern_id, pattern in enumerate(patterns):
+        state = 0
+        for char in pattern:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][char] = next_state
+                goto.append({})
+                terminal.append(-1)
+            state = next_state
+        terminal[state] = pattern_id
+
+    fail = [0] * len(goto)
+    output_link = [-1] * len(goto)
+
+    # breadth first over the trie to compute failure and output links
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+
+            link = fail[next_state]
+            output_link[next_state] = (
+                link if terminal[link] != -1 else output_link[link]
+            )
+
+    return goto, fail, terminal, output_link
+
+
+def find_substrings(
+    text: str, index: Tuple[List[Dict[str, int]], List[int], List[int], List[int]]
+) -> Iterator[int]:
+    """Yields the ids of all indexed patterns that occur in text.
+
+    Args:
+        text (str): the text to be searched
+        index (Tuple[...]): automaton built by build_substring_index
+
+    Yields:
+        int: pattern id, possibly more than once
+    """
+    goto, fail, terminal, output_link = index
+    state = 0
+
+    for char in text:
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
 
-    log.info("Finished processing artists.")
+        match = state if terminal[state] != -1 else output_link[state]
+        while match != -1:
+            yield terminal[match]
+            match = output_link[match]
 
 
 def filter_similar_song_names(track_rows: List[List[str]]) -> List[List[str]]:
     """Filter a list of track_rows. Group similar starting song names and
     choose the one with highest popularity among them.
 
+    A track joins the group of the first earlier ungrouped track whose name is
+    contained in its own name, which yields the same groups as
+    filter_similar_song_names_naive. For larger lists containment is looked up
+    through an Aho-Corasick index over all names instead of comparing every pair.
+
+    Args:
+        track_row (List[List[str]]): the track_rows to be filtered
+
+    Returns:
+        List[List[str]]: the filtered list of track_rows
+    """
+    if len(track_rows) < INDEXED_GROUPING_MIN_TRACKS:
+        return filter_similar_song_names_naive(track_rows)
+
+    names = [row[1] for row in track_rows]
+    patterns = list(dict.fromkeys(name for name in names if name))
+    pattern_ids = {name: pattern_id for pattern_id, name in enumerate(patterns)}
+    index = build_substring_index(patterns)
+
+    # first index of every pattern that started a group, only one per name
+    group_of_pattern = {}
+    # an empty name is contained in every later name
+    empty_group = None
+    groups = {}
+
+    for j, name in enumerate(names):
+        group = empty_group
+
+        if name:
+            for pattern_id in find_substrings(name, index):
+                candidate = group_of_pattern.get(pattern_id)
+                if candidate is not None and (group is None or candidate < group):
+                    group = candidate
+
+        if group is None:
+            # start a new group with the current song as the best so far
+            groups[j] = j
+            if name:
+                group_of_pattern[pattern_ids[name]] = j
+            else:
+                empty_group = j
+        elif track_rows[groups[group]][2] < track_rows[j][2]:
+            # look for highest popularity among similar songs
+            groups[group] = j
+
+    # groups are created in index order, so is the result
+    return [track_rows[best_idx] for best_idx in groups.values()]
+
+
+def filter_similar_song_names_naive(track_rows: List[List[str]]) -> List[List[str]]:
+    """Filter a list of track_rows. Group similar starting song names and
+    choose the one with highest popularity among them. Quadratic reference
+    implementation of filter_similar_song_names.
+
     Args:
         track_row (List[List[str]]): the track_rows to be filtered
 
@@ -166,11 +405,13 @@ def filter_similar_song_names(track_rows: List[List[str]]) -> List[List[str]]:
     return [track_rows[i] for i in best_indices]
 
 
-def valid_lyrics(lyrics: str) -> str:
+def valid_lyrics(lyrics: str, is_lyrics: bool = None) -> str:
     """Check if lyrics are valid. Valid lyrics are from type str and english.
 
     Args:
         lyrics (str): the lyrics of the song
+        is_lyrics (bool, optional): result of content_is_lyrics if already
+            computed by normalize_lyrics. Defaults to None.
 
     Returns:
         (bool): True if lyrics are valid, else False
@@ -184,10 +425,16 @@ def valid_lyrics(lyrics: str) -> str:
     ):
         return False
 
+    # string is lyrics (not list of artists, novel, ..)
+    if is_lyrics is None:
+        is_lyrics = content_is_lyrics(lyrics)
+    if not is_lyrics:
+        return False
+
     # lang english?
     lang = ""
     try:
-        lang = detect(lyrics)
+        lang = detect_language(lyrics)
     except Exception as err:
         log.error(f'Failed to detect language of "{lyrics[:10]}" due to error {err}')
         return False
@@ -195,13 +442,80 @@ def valid_lyrics(lyrics: str) -> str:
     if lang != "en":
         return False
 
-    # string is lyrics (not list of artists, novel, ..)
-    if not content_is_lyrics(lyrics):
-        return False
-
     return True
 
 
+def detect_language(lyrics: str) -> str:
+    """Detects the language of lyrics. Clear cases are decided by guess_language,
+    others by langdetect. The recent verdicts are memoized by the hash of the
+    lyrics.
+
+    Args:
+        lyrics (str): the lyrics of the song
+
+    Raises:
+        Exception: langdetect failed to detect the language
+
+    Returns:
+        str: language code, "en" for english
+    """
+    digest = hashlib.sha1(lyrics.encode("utf-8")).hexdigest()
+
+    with language_verdicts_lock:
+        lang = language_verdicts.get(digest)
+        if lang is not None:
+            language_verdicts.move_to_end(digest)
+
+    if lang is None and language_cache is not None:
+        lang = language_cache.get_language(digest)
+
+    if lang is None:
+        lang = guess_language(lyrics) or detect(lyrics)
+
+        if language_cache is not None:
+            language_cache.put_language(digest, lang)
+
+    with language_verdicts_lock:
+        language_verdicts[digest] = lang
+        language_verdicts.move_to_end(digest)
+        if len(language_verdicts) > LANGUAGE_VERDICTS_SIZE:
+            language_verdicts.popitem(last=False)
+
+    return lang
+
+
+def guess_language(lyrics: str) -> Optional[str]:
+    """Guesses whether lyrics are english from the share of english stopwords and
+    non-ascii letters in their beginning.
+
+    Args:
+        lyrics (str): the lyrics of the song
+
+    Returns:
+        Optional[str]: "en", "other" or None if the lyrics are ambiguous
+    """
+    prefix = lyrics[:LANGUAGE_PREFIX_LENGTH].lower()
+
+    letters = [c for c in prefix if c.isalpha()]
+    if not letters:
+        return None
+
+    # mostly non-latin or accented letters
+    if sum(1 for c in letters if not c.isascii()) / len(letters) > 0.3:
+        return "other"
+
+    words = re.findall(r"[a-z']+", prefix)
+    if len(words) < 20:
+        return None
+
+    stopword_share = sum(1 for w in words if w in ENGLISH_STOPWORDS) / len(words)
+    if stopword_share >= 0.25:
+        return "en"
+    elif stopword_share < 0.05:
+        return "other"
+    return None
+
+
 def clean_lyrics(lyrics: str) -> str:
     """Remove special tokens from lyrics
 
@@ -211,10 +525,7 @@ def clean_lyrics(lyrics: str) -> str:
     Returns:
         (str): cleaned lyrics
     """
-
-    # Remove special tokens
-    pattern = re.compile("/\[(\w|\s)*\]/g")
-    return re.sub(pattern, str.replace, str(lyrics))
+    return normalize_lyrics(str(lyrics))[0]
 
 
 def content_is_lyrics(input_content: str):
@@ -226,30 +537,72 @@ def content_is_lyrics(input_content: str):
     Returns:
         bool: True, if the content is lyrics, otherwise False
     """
-    lines = input_content.splitlines()
+    return normalize_lyrics(input_content)[1]
 
-    if len(lines) >= 300:
-        return False
 
+def normalize_lyrics(lyrics: str) -> Tuple[str, bool]:
+    """Removes section tags like [Chorus] from lyrics and checks if the content is
+    lyrics and not some kind of enumeration in a single pass over the lines.
+
+    The checks consider the lines as given, before tags are removed. Content is
+    not lyrics if it has 300 or more lines, a line mentions Psalms or 10 lines
+    containing dashes occur before 10 lines without.
+
+    Args:
+        lyrics (str): the lyrics of the song
+
+    Returns:
+        Tuple[str, bool]: (cleaned lyrics, True if the content is lyrics)
+    """
+    lines = lyrics.splitlines()
+    cleaned_lines = []
+
+    is_lyrics = None
     invalid_lines = 0
     valid_lines = 0
 
     for line in lines:
-        if not len(line):
+        if not line:
+            cleaned_lines.append(line)
             continue
 
-        if "-" in line or "--" in line or "–" in line:
-            invalid_lines += 1
-        elif "Psalms" in line:
-            return False
-        else:
-            # if lines does not contain '-' or similar
-            valid_lines += 1
+        if is_lyrics is None:
+            if "-" in line or "–" in line:
+                invalid_lines += 1
+            elif "Psalms" in line:
+                is_lyrics = False
+            else:
+                # if lines does not contain '-' or similar
+                valid_lines += 1
+
+            # decided after at most 19 non-empty lines
+            if invalid_lines >= 10:
+                is_lyrics = False
+            elif valid_lines >= 10:
+                is_lyrics = True
+
+        cleaned_line = SECTION_TAG_PATTERN.sub("", line)
+
+        if cleaned_line == line:
+            cleaned_lines.append(line)
+        elif cleaned_line.strip():
+            cleaned_lines.append(cleaned_line.strip())
+        # else: line only consisted of tags and is dropped
 
-        # checked at most 19 lines in each file
-        if invalid_lines >= 10:
-            return False
-        elif valid_lines >= 10:
-            return True
+    if len(lines) >= 300:
+        is_lyrics = False
 
-    return True
+    return ("\n".join(cleaned_lines), is_lyrics is not False)
+
+
+def normalize_lyrics_batch(lyrics_list: List[str]) -> List[Tuple[str, bool]]:
+    """Normalizes a list of lyrics, see normalize_lyrics.
+
+    Args:
+        lyrics_list (List[str]): lyrics of several songs
+
+    Returns:
+        List[Tuple[str, bool]]: (cleaned lyrics, True if the content is lyrics)
+            for each lyrics
+    """
+    return [normalize_lyrics(lyrics) for lyrics in lyrics_list]
@@ -1,11 +1,38 @@
 import csv
+import io
 import logging
 import os
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stderr
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
 
 from ..database import db_interface as db
+from .preprocessing import (
+    process_artist_row,
+    process_artists_frame,
+    process_track_row,
+    process_tracks_frame,
+)
 
 log = logging.getLogger("dataset")
 
+load_dotenv()
+
+SPOTIFY_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "spotify"
+
+# columns kept as text by position, the others are parsed as numbers
+TRACKS_TEXT_COLUMNS = [0, 1, 5, 6, 7]
+ARTISTS_TEXT_COLUMNS = [0, 2, 3]
+
+# bytes read at once while splitting a csv file into ranges
+SPLIT_BLOCK_SIZE = 1024 ** 2
+
 
 def read_tracks_csv(db_name: str):
     """Reads tracks.csv and inserts into spotify_ds db."""
@@ -15,7 +42,7 @@ def read_tracks_csv(db_name: str):
 
     skipped_tracks = []
 
-    tracks_csv_path = os.getenv("DATA_PATH") + "\\datasets\\spotify\\tracks.csv"
+    tracks_csv_path = SPOTIFY_PATH / "tracks.csv"
     with open(tracks_csv_path, encoding="utf-8") as tracks_csv:
         # read raw label data
         tracks_reader = csv.reader(tracks_csv)
@@ -46,7 +73,7 @@ def read_artists_csv(db_name: str):
 
     skipped_artists = []
 
-    artists_csv_path = os.getenv("DATA_PATH") + "\\datasets\\spotify\\artists.csv"
+    artists_csv_path = SPOTIFY_PATH / "artists.csv"
     with open(artists_csv_path, encoding="utf-8") as artists_csv:
         # read raw label data
         artists_reader = csv.reader(artists_csv)
@@ -67,3 +94,684 @@ def read_artists_csv(db_name: str):
         log.warn(f"Skipped {len(skipped_artists)} artists")
 
     log.info("Completed reading artists.csv")
+
+
+def read_csv_chunks(csv_path: Path, chunk_size: int) -> Iterator[List[List[str]]]:
+    """Reads a csv file and yields its rows in chunks, skipping the header row.
+
+    Args:
+        csv_path (Path): path of the csv file
+        chunk_size (int): maximum number of rows per chunk
+
+    Yields:
+        List[List[str]]: chunk of raw csv rows
+    """
+    with open(csv_path, encoding="utf-8", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+
+        # skip first row to remove column names
+        next(reader, None)
+
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def write_skipped_rows(skipped_rows: List[List[str]], file_name: str):
+    """Writes rejected csv rows into a report next to the spotify dataset.
+
+    Args:
+        skipped_rows (List[List[str]]): rows that were not inserted
+        file_name (str): name of the report file
+    """
+    report_path = SPOTIFY_PATH / file_name
+
+    with open(report_path, "w", encoding="utf-8", newline="") as report_file:
+        csv.writer(report_file).writerows(skipped_rows)
+
+    log.warning(f"Skipped {len(skipped_rows)} rows, see report at {report_path}")
+
+
+def read_tracks_csv_bulk(db_name: str, chunk_size: int = 50000):
+    """Reads tracks.csv in chunks and bulk inserts into spotify_ds db.
+
+    Every chunk is written with a single executemany in one transaction instead of
+    committing every track on its own.
+
+    Args:
+        db_name (str): the name of the database
+        chunk_size (int, optional): rows per transaction. Defaults to 50000.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_tracks = []
+    inserted_tracks = 0
+
+    tracks_csv_path = SPOTIFY_PATH / "tracks.csv"
+    log.info(f"Bulk reading tracks.csv from path {tracks_csv_path}")
+
+    for chunk in read_csv_chunks(tracks_csv_path, chunk_size):
+        raw_rows = []
+        processed_rows = []
+
+        for row in chunk:
+            # process_track_row modifies the row, keep the raw row for the report
+            processed_row = process_track_row(list(row))
+            if processed_row is None:
+                skipped_tracks.append(row)
+            else:
+                raw_rows.append(row)
+                processed_rows.append(processed_row)
+
+        rejected_indices = db.insert_tracks_bulk(processed_rows, cnx, cursor)
+        skipped_tracks.extend(raw_rows[i] for i in rejected_indices)
+        inserted_tracks += len(processed_rows) - len(rejected_indices)
+
+        log.info(f"Inserted {inserted_tracks} tracks so far")
+
+    if len(skipped_tracks) > 0:
+        write_skipped_rows(skipped_tracks, "skipped_tracks.csv")
+
+    log.info("Completed bulk reading tracks.csv")
+
+
+def read_artists_csv_bulk(db_name: str, chunk_size: int = 50000):
+    """Reads artists.csv in chunks and bulk inserts artists and genres into
+    spotify_ds db.
+
+    Known genres are kept in memory instead of querying the genres table for every
+    genre of every artist.
+
+    Args:
+        db_name (str): the name of the database
+        chunk_size (int, optional): rows per transaction. Defaults to 50000.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_artists = []
+    inserted_artists = 0
+
+    # seed genres once from the table
+    known_genres = db.get_genres(cursor)
+
+    artists_csv_path = SPOTIFY_PATH / "artists.csv"
+    log.info(f"Bulk reading artists.csv from path {artists_csv_path}")
+
+    for chunk in read_csv_chunks(artists_csv_path, chunk_size):
+        raw_rows = []
+        artist_rows = []
+        artist_genres = []
+
+        for row in chunk:
+            # process_artist_row modifies the row, keep the raw row for the report
+            processed = process_artist_row(list(row))
+            if processed is None:
+                skipped_artists.append(row)
+                continue
+
+            artist_row, genres = processed
+            raw_rows.append(row)
+            artist_rows.append(artist_row)
+            artist_genres.extend((artist_row[0], g) for g in genres)
+
+        try:
+            db.insert_artists_bulk(
+                artist_rows, artist_genres, known_genres, cnx, cursor
+            )
+        except Exception as err:
+            log.warning(
+                f"Skipping chunk of {len(raw_rows)} artists due to error: {err}"
+            )
+            skipped_artists.extend(raw_rows)
+            continue
+
+        inserted_artists += len(artist_rows)
+        log.info(f"Inserted {inserted_artists} artists so far")
+
+    if len(skipped_artists) > 0:
+        write_skipped_rows(skipped_artists, "skipped_artists.csv")
+
+    log.info("Completed bulk reading artists.csv")
+
+
+def count_fields(csv_path: Path) -> np.ndarray:
+    """Counts the fields of the records of a csv file after its header, skipping
+    empty lines like pandas. Delimiters and newlines within quoted fields are
+    skipped by tracking whether the number of quotes so far is odd, as in
+    split_csv.
+
+    Args:
+        csv_path (Path): path of the csv file
+
+    Returns:
+        np.ndarray: number of fields of every non-empty record
+    """
+    counts = []
+
+    with open(csv_path, "rb") as csv_file:
+        # the header has no quoted newlines
+        csv_file.readline()
+
+        in_quotes = 0
+        # delimiters and bytes of the record continued from the previous block
+        record_delimiters = 0
+        record_bytes = 0
+
+        while True:
+            block = np.frombuffer(csv_file.read(SPLIT_BLOCK_SIZE), dtype=np.uint8)
+            if len(block) == 0:
+                break
+
+            quoted = np.bitwise_xor.accumulate(block == ord('"')) ^ in_quotes
+            in_quotes = int(quoted[-1])
+
+            unquoted = quoted == 0
+            delimiters = np.flatnonzero((block == ord(",")) & unquoted)
+            newlines = np.flatnonzero((block == ord("\n")) & unquoted)
+
+            # delimiters and bytes before every newline, the carry belongs to the
+            # first record
+            record_ends = np.concatenate([[-1], newlines])
+            delimiter_counts = np.diff(np.searchsorted(delimiters, record_ends))
+            byte_counts = np.diff(record_ends) - 1
+            if len(newlines) > 0:
+                delimiter_counts[0] += record_delimiters
+                byte_counts[0] += record_bytes
+
+                # a carriage return alone is an empty line as well
+                carriage_returns = block[newlines - 1] == ord("\r")
+                byte_counts -= carriage_returns & (newlines > 0)
+
+                counts.append(delimiter_counts[byte_counts > 0] + 1)
+                record_delimiters = 0
+                record_bytes = 0
+
+            last_end = newlines[-1] if len(newlines) > 0 else -1
+            record_delimiters += len(delimiters) - np.searchsorted(delimiters, last_end)
+            record_bytes += len(block) - 1 - last_end
+
+    if record_bytes > 0:
+        counts.append(np.array([record_delimiters + 1]))
+
+    return np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+
+
+def read_csv_frames(
+    csv_path: Path, chunk_size: int, text_columns: List[int]
+) -> Iterator[pd.DataFrame]:
+    """Reads a csv file with pandas and yields its rows in typed chunks.
+
+    Text columns are read as they are, only empty values of numeric columns
+    become NaN, which is stored as NULL. Lines with too many or too few fields
+    are skipped and logged instead of aborting the read, as the row readers
+    reject them.
+
+    Args:
+        csv_path (Path): path of the csv file
+        chunk_size (int): maximum number of rows per chunk
+        text_columns (List[int]): positions of the columns kept as text
+
+    Yields:
+        pd.DataFrame: chunk of csv rows
+    """
+    with open(csv_path, encoding="utf-8", newline="") as csv_file:
+        header = next(csv.reader(csv_file))
+
+    numeric_columns = [c for i, c in enumerate(header) if i not in text_columns]
+
+    # pandas pads short lines with empty fields, so the fields are counted on the
+    # raw file once a row ends with an empty field, aligned with the rows pandas
+    # keeps
+    field_counts = None
+    rows_read = 0
+
+    with pd.read_csv(
+        csv_path,
+        chunksize=chunk_size,
+        dtype={header[i]: str for i in text_columns},
+        keep_default_na=False,
+        na_values={c: [""] for c in numeric_columns},
+        encoding="utf-8",
+        on_bad_lines="warn",
+    ) as reader:
+        # a callback for bad lines needs the python parser, which is several times
+        # slower, the c parser prints them to stderr before pandas 2 and warns later
+        while True:
+            with warnings.catch_warnings(record=True) as caught, redirect_stderr(
+                io.StringIO()
+            ) as stderr:
+                warnings.simplefilter("always", pd.errors.ParserWarning)
+                chunk = next(reader, None)
+
+            messages = stderr.getvalue().splitlines()
+            for warning in caught:
+                if issubclass(warning.category, pd.errors.ParserWarning):
+                    messages.extend(str(warning.message).splitlines())
+                else:
+                    warnings.showwarning(
+                        warning.message,
+                        warning.category,
+                        warning.filename,
+                        warning.lineno,
+                    )
+
+            for message in messages:
+                if message.strip():
+                    log.warning(f"{csv_path.name}: {message.strip()}")
+
+            if chunk is None:
+                if field_counts is not None and len(field_counts) != rows_read:
+                    log.warning(
+                        f"{csv_path.name}: counted {len(field_counts)} records, but "
+                        f"read {rows_read} rows, short rows may be misidentified"
+                    )
+                break
+
+            last_fields = chunk.iloc[:, -1]
+            short = (last_fields.isna() | (last_fields == "")).to_numpy()
+            if short.any():
+                if field_counts is None:
+                    field_counts = count_fields(csv_path)
+                    field_counts = field_counts[field_counts <= len(header)]
+                short = short & (
+                    field_counts[rows_read : rows_read + len(chunk)] < len(header)
+                )
+            rows_read += len(chunk)
+
+            for row_id in chunk.iloc[short, 0]:
+                log.warning(
+                    f"{csv_path.name}: Skipping row {row_id}: "
+                    f"expected {len(header)} fields, saw fewer"
+                )
+            yield chunk[~short]
+
+
+def frame_to_rows(frame: pd.DataFrame) -> List[List]:
+    """Converts a frame into rows of python values for executemany.
+
+    Args:
+        frame (pd.DataFrame): the frame
+
+    Returns:
+        List[List]: the rows
+    """
+    return frame.to_numpy(dtype=object).tolist()
+
+
+def read_tracks_csv_vectorized(db_name: str, chunk_size: int = 100000):
+    """Reads tracks.csv in chunks with pandas, processes every chunk on whole
+    columns and bulk inserts it into spotify_ds db.
+
+    Args:
+        db_name (str): the name of the database
+        chunk_size (int, optional): rows per transaction. Defaults to 100000.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_tracks = []
+    inserted_tracks = 0
+
+    tracks_csv_path = SPOTIFY_PATH / "tracks.csv"
+    log.info(f"Vectorized reading tracks.csv from path {tracks_csv_path}")
+
+    for chunk in read_csv_frames(tracks_csv_path, chunk_size, TRACKS_TEXT_COLUMNS):
+        processed_rows = frame_to_rows(process_tracks_frame(chunk))
+
+        rejected_indices = db.insert_tracks_bulk(processed_rows, cnx, cursor)
+        if rejected_indices:
+            skipped_tracks.extend(frame_to_rows(chunk.iloc[rejected_indices]))
+        inserted_tracks += len(processed_rows) - len(rejected_indices)
+
+        log.info(f"Inserted {inserted_tracks} tracks so far")
+
+    if len(skipped_tracks) > 0:
+        write_skipped_rows(skipped_tracks, "skipped_tracks.csv")
+
+    log.info("Completed vectorized reading tracks.csv")
+
+
+def read_artists_csv_vectorized(db_name: str, chunk_size: int = 100000):
+    """Reads artists.csv in chunks with pandas, processes every chunk on whole
+    columns and bulk inserts artists and genres into spotify_ds db.
+
+    Args:
+        db_name (str): the name of the database
+        chunk_size (int, optional): rows per transaction. Defaults to 100000.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_artists = []
+    inserted_artists = 0
+
+    # seed genres once from the table
+    known_genres = db.get_genres(cursor)
+
+    artists_csv_path = SPOTIFY_PATH / "artists.csv"
+    log.info(f"Vectorized reading artists.csv from path {artists_csv_path}")
+
+    for chunk in read_csv_frames(artists_csv_path, chunk_size, ARTISTS_TEXT_COLUMNS):
+        artists, artist_genres = process_artists_frame(chunk)
+        artist_rows = frame_to_rows(artists)
+
+        try:
+            db.insert_artists_bulk(
+                artist_rows,
+                list(artist_genres.itertuples(index=False, name=None)),
+                known_genres,
+                cnx,
+                cursor,
+            )
+        except Exception as err:
+            log.warning(
+                f"Skipping chunk of {len(artist_rows)} artists due to error: {err}"
+            )
+            skipped_artists.extend(frame_to_rows(chunk))
+            continue
+
+        inserted_artists += len(artist_rows)
+        log.info(f"Inserted {inserted_artists} artists so far")
+
+    if len(skipped_artists) > 0:
+        write_skipped_rows(skipped_artists, "skipped_artists.csv")
+
+    log.info("Completed vectorized reading artists.csv")
+
+
+def split_csv(csv_path: Path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Splits a csv file after its header into byte ranges of about chunk_bytes,
+    which end at the end of a record. Newlines within quoted fields are skipped
+    by tracking whether the number of quotes since the start of the file is odd.
+
+    Args:
+        csv_path (Path): path of the csv file
+        chunk_bytes (int): minimum size of a range, except for the last one
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) byte offsets of the ranges
+    """
+    with open(csv_path, "rb") as csv_file:
+        # the header has no quoted newlines
+        csv_file.readline()
+        boundaries = [csv_file.tell()]
+
+        in_quotes = False
+        block_start = boundaries[0]
+        target = block_start + chunk_bytes
+
+        while True:
+            block = csv_file.read(SPLIT_BLOCK_SIZE)
+            if not block:
+                break
+
+            # quotes before i are already counted
+            i = 0
+            while target < block_start + len(block):
+                j = max(i, target - block_start)
+                in_quotes ^= block.count(b'"', i, j) % 2 == 1
+                i = j
+
+                newline = block.find(b"\n", i)
+                if newline == -1:
+                    break
+
+                in_quotes ^= block.count(b'"', i, newline) % 2 == 1
+                i = newline + 1
+
+                if in_quotes:
+                    # newline within a quoted field, continue at the next one
+                    target = block_start + i
+                else:
+                    boundaries.append(block_start + i)
+                    target = block_start + i + chunk_bytes
+
+            in_quotes ^= block.count(b'"', i) % 2 == 1
+            block_start += len(block)
+
+    if boundaries[-1] < block_start:
+        boundaries.append(block_start)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_csv_range(csv_path: Path, start: int, end: int) -> List[List[str]]:
+    """Reads the records of a byte range of a csv file.
+
+    Args:
+        csv_path (Path): path of the csv file
+        start (int): offset of the first record
+        end (int): offset after the last record
+
+    Returns:
+        List[List[str]]: raw csv rows
+    """
+    with open(csv_path, "rb") as csv_file:
+        csv_file.seek(start)
+        content = csv_file.read(end - start).decode("utf-8")
+
+    return list(csv.reader(io.StringIO(content, newline="")))
+
+
+def parse_tracks_range(
+    csv_path: Path, start: int, end: int
+) -> Tuple[List[List[str]], List[List[str]], List[List[str]]]:
+    """Reads and processes the tracks of a byte range of tracks.csv.
+
+    Args:
+        csv_path (Path): path of tracks.csv
+        start (int): offset of the first record
+        end (int): offset after the last record
+
+    Returns:
+        Tuple[List[List[str]], List[List[str]], List[List[str]]]: (raw rows,
+            processed rows, skipped rows)
+    """
+    raw_rows = []
+    processed_rows = []
+    skipped_rows = []
+
+    for row in read_csv_range(csv_path, start, end):
+        # process_track_row modifies the row, keep the raw row for the report
+        processed_row = process_track_row(list(row))
+        if processed_row is None:
+            skipped_rows.append(row)
+        else:
+            raw_rows.append(row)
+            processed_rows.append(processed_row)
+
+    return (raw_rows, processed_rows, skipped_rows)
+
+
+def parse_artists_range(
+    csv_path: Path, start: int, end: int
+) -> Tuple[List[List[str]], List[List[str]], List[Tuple[str, str]], List[List[str]]]:
+    """Reads and processes the artists of a byte range of artists.csv.
+
+    Args:
+        csv_path (Path): path of artists.csv
+        start (int): offset of the first record
+        end (int): offset after the last record
+
+    Returns:
+        Tuple[List[List[str]], List[List[str]], List[Tuple[str, str]],
+            List[List[str]]]: (raw rows, artist rows, (artist_id, genre) pairs,
+            skipped rows)
+    """
+    raw_rows = []
+    artist_rows = []
+    artist_genres = []
+    skipped_rows = []
+
+    for row in read_csv_range(csv_path, start, end):
+        # process_artist_row modifies the row, keep the raw row for the report
+        processed = process_artist_row(list(row))
+        if processed is None:
+            skipped_rows.append(row)
+            continue
+
+        artist_row, genres = processed
+        raw_rows.append(row)
+        artist_rows.append(artist_row)
+        artist_genres.extend((artist_row[0], g) for g in genres)
+
+    return (raw_rows, artist_rows, artist_genres, skipped_rows)
+
+
+def read_csv_parallel(
+    csv_path: Path,
+    parse_range: Callable,
+    write_result: Callable,
+    workers: int,
+    chunk_bytes: int,
+    max_pending: int,
+):
+    """Parses byte ranges of a csv file in a process pool and hands the results to
+    write_result in the calling process, which is the only writer of the db.
+
+    At most max_pending ranges are submitted but not yet written, so parsing
+    waits for the writer instead of piling up results in memory.
+
+    Args:
+        csv_path (Path): path of the csv file
+        parse_range (Callable): parses a range, called as (csv_path, start, end)
+        write_result (Callable): writes the result of a range
+        workers (int): number of parsing processes
+        chunk_bytes (int): size of a range
+        max_pending (int): maximum number of ranges in flight
+    """
+    ranges = split_csv(csv_path, chunk_bytes)
+    log.info(f"Split {csv_path} into {len(ranges)} ranges for {workers} workers")
+
+    ranges = iter(ranges)
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for start, end in ranges:
+                pending.add(executor.submit(parse_range, csv_path, start, end))
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                write_result(future.result())
+
+
+def read_tracks_csv_parallel(
+    db_name: str,
+    workers: int = os.cpu_count(),
+    chunk_bytes: int = 16 * 1024 ** 2,
+    max_pending: int = None,
+):
+    """Reads tracks.csv in byte ranges parsed by multiple processes and bulk
+    inserts the tracks into spotify_ds db from this process.
+
+    Args:
+        db_name (str): the name of the database
+        workers (int, optional): number of parsing processes.
+            Defaults to the number of cpus.
+        chunk_bytes (int, optional): size of a range. Defaults to 16 MB.
+        max_pending (int, optional): maximum number of ranges in flight.
+            Defaults to twice the number of workers.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_tracks = []
+    inserted_tracks = 0
+
+    def write_tracks(result):
+        nonlocal inserted_tracks
+        raw_rows, processed_rows, skipped_rows = result
+        skipped_tracks.extend(skipped_rows)
+
+        rejected_indices = db.insert_tracks_bulk(processed_rows, cnx, cursor)
+        skipped_tracks.extend(raw_rows[i] for i in rejected_indices)
+        inserted_tracks += len(processed_rows) - len(rejected_indices)
+
+        log.info(f"Inserted {inserted_tracks} tracks so far")
+
+    tracks_csv_path = SPOTIFY_PATH / "tracks.csv"
+    log.info(f"Parallel reading tracks.csv from path {tracks_csv_path}")
+
+    read_csv_parallel(
+        tracks_csv_path,
+        parse_tracks_range,
+        write_tracks,
+        workers,
+        chunk_bytes,
+        max_pending or 2 * workers,
+    )
+
+    if len(skipped_tracks) > 0:
+        write_skipped_rows(skipped_tracks, "skipped_tracks.csv")
+
+    log.info("Completed parallel reading tracks.csv")
+
+
+def read_artists_csv_parallel(
+    db_name: str,
+    workers: int = os.cpu_count(),
+    chunk_bytes: int = 16 * 1024 ** 2,
+    max_pending: int = None,
+):
+    """Reads artists.csv in byte ranges parsed by multiple processes and bulk
+    inserts artists and genres into spotify_ds db from this process.
+
+    Args:
+        db_name (str): the name of the database
+        workers (int, optional): number of parsing processes.
+            Defaults to the number of cpus.
+        chunk_bytes (int, optional): size of a range. Defaults to 16 MB.
+        max_pending (int, optional): maximum number of ranges in flight.
+            Defaults to twice the number of workers.
+    """
+    cnx, cursor = db.connect_to_db(db_name)
+
+    skipped_artists = []
+    inserted_artists = 0
+
+    # seed genres once from the table
+    known_genres = db.get_genres(cursor)
+
+    def write_artists(result):
+        nonlocal inserted_artists
+        raw_rows, artist_rows, artist_genres, skipped_rows = result
+        skipped_artists.extend(skipped_rows)
+
+        try:
+            db.insert_artists_bulk(
+                artist_rows, artist_genres, known_genres, cnx, cursor
+            )
+        except Exception as err:
+            log.warning(
+                f"Skipping chunk of {len(raw_rows)} artists due to error: {err}"
+            )
+            skipped_artists.extend(raw_rows)
+            return
+
+        inserted_artists += len(artist_rows)
+        log.info(f"Inserted {inserted_artists} artists so far")
+
+    artists_csv_path = SPOTIFY_PATH / "artists.csv"
+    log.info(f"Parallel reading artists.csv from path {artists_csv_path}")
+
+    read_csv_parallel(
+        artists_csv_path,
+        parse_artists_range,
+        write_artists,
+        workers,
+        chunk_bytes,
+        max_pending or 2 * workers,
+    )
+
+    if len(skipped_artists) > 0:
+        write_skipped_rows(skipped_artists, "skipped_artists.csv")
+
+    log.info("Completed parallel reading artists.csv")
@@ -0,0 +1,208 @@
+import logging
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import src.database.db_interface as db
+from src.training.grid_training import FEATURE_SETS, complete_features
+from src.training.postprocessing import load_model, read_manifest
+
+log = logging.getLogger("main")
+
+
+def iter_db_features(
+    db_name: str,
+    label_scheme: str,
+    feature_set: str,
+    chunk_size: int,
+    max_followers: float = None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Streams the features of the tracks with lyric scores from the database.
+
+    Args:
+        db_name (str): name of the database
+        label_scheme (str): label scheme the model is trained with
+        feature_set (str): key of FEATURE_SETS
+        chunk_size (int): number of tracks per chunk
+        max_followers (float, optional): followers scaled to 100, as in the
+            training data of the model. Defaults to the current maximum of the
+            database.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: (song ids, features) of a chunk, a single
+            empty chunk if no track has lyric scores
+    """
+    max_followers_query = """
+        SELECT MAX(a.followers)
+        FROM artists AS a
+        INNER JOIN tracks AS t ON t.primary_artist_id == a.id
+        INNER JOIN lyric_scores AS ls ON t.id == ls.song_id;
+    """
+
+    # every track with lyric scores, in the columns of get_complete_df
+    query = """
+        SELECT *
+        FROM tracks t
+        INNER JOIN track_status AS ts ON t.id == ts.song_id
+        INNER JOIN lyric_scores AS ls ON t.id == ls.song_id
+        INNER JOIN artists AS a ON t.primary_artist_id == a.id
+        INNER JOIN artist_genres AS ag ON ag.artist_id == t.primary_artist_id
+        GROUP BY t.id;
+    """
+
+    cnx, cursor = db.connect_to_db(db_name, read_only=True)
+
+    # models without manifest are scaled by the tracks in the database now
+    if max_followers is None:
+        max_followers = cursor.execute(max_followers_query).fetchone()[0]
+
+    cursor.execute(query)
+    columns = [column[0] for column in cursor.description]
+
+    chunks = 0
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows and chunks > 0:
+            break
+
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        features, _ = complete_features(df, label_scheme, max_followers)
+        yield df.iloc[:, 0].to_numpy(), features[:, FEATURE_SETS[feature_set]]
+
+        chunks += 1
+        if not rows:
+            break
+
+
+def iter_csv_features(
+    csv_path: str, chunk_size: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Streams prepared feature rows from a csv file. The first column holds the
+    song id, the other columns the features in the order of the model.
+
+    Args:
+        csv_path (str): path of the csv file
+        chunk_size (int): number of rows per chunk
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: (song ids, features) of a chunk
+    """
+    for df in pd.read_csv(csv_path, chunksize=chunk_size):
+        yield df.iloc[:, 0].to_numpy(), df.iloc[:, 1:].to_numpy(dtype=np.float64)
+
+
+def predict_chunk(model, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Predicts the class and its probability for a chunk of features.
+
+    Args:
+        model: the classifier
+        features (np.ndarray): the features
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (labels, probabilities), the probabilities
+            are None if the model has no predict_proba
+    """
+    try:
+        proba = model.predict_proba(features)
+    except AttributeError:
+        return model.predict(features), None
+
+    best = proba.argmax(axis=1)
+    return model.classes_[best], proba[np.arange(len(best)), best]
+
+
+def model_features(model_name: str, model_type: str) -> Tuple[str, str, float]:
+    """Returns how the features of a model are built from the database, as
+    recorded in its manifest by train_model.
+
+    Args:
+        model_name (str): name of the model
+        model_type (str): name of parent folder of the model
+
+    Raises:
+        ValueError: the manifest does not record the features
+
+    Returns:
+        Tuple[str, str, float]: (feature_set, label_scheme, max_followers)
+    """
+    manifest = read_manifest(model_name, model_type) or {}
+    keys = ["features", "label_scheme", "max_followers"]
+    missing = [key for key in keys if manifest.get(key) is None]
+
+    if missing:
+        raise ValueError(
+            f"Manifest of model {model_type}/{model_name} lacks {missing}, "
+            "store the model with train_model"
+        )
+
+    return tuple(manifest[key] for key in keys)
+
+
+def predict(
+    model_name: str,
+    model_type: str,
+    db_name: str = "spotify_ds",
+    chunk_size: int = 10000,
+    csv_path: str = None,
+) -> int:
+    """Predicts the popularity of every track with lyric scores, or of the rows
+    of a csv file, and stores the predictions in the predictions table.
+
+    The tracks are read, predicted and written in chunks, so the memory does not
+    grow with the number of tracks. The features of the tracks in the database
+    are built as recorded in the manifest of the model, see model_features.
+
+    Args:
+        model_name (str): name of the model
+        model_type (str): name of parent folder of the model
+        db_name (str, optional): name of the database. Defaults to "spotify_ds".
+        chunk_size (int, optional): number of tracks per chunk.
+            Defaults to 10000.
+        csv_path (str, optional): csv file of prepared feature rows to predict
+            instead of the database. Defaults to None.
+
+    Raises:
+        ValueError: the manifest does not record the features of the model
+
+    Returns:
+        int: number of predicted tracks
+    """
+    if csv_path is not None:
+        chunks = iter_csv_features(csv_path, chunk_size)
+    else:
+        feature_set, label_scheme, max_followers = model_features(
+            model_name, model_type
+        )
+        chunks = iter_db_features(
+            db_name, label_scheme, feature_set, chunk_size, max_followers
+        )
+
+    model = load_model(model_name, model_type)
+
+    cnx, cursor = db.connect_to_db(db_name)
+    model_key = f"{model_type}/{model_name}"
+    predicted = 0
+
+    for song_ids, features in chunks:
+        if len(song_ids) == 0:
+            continue
+
+        labels, probabilities = predict_chunk(model, features)
+
+        if probabilities is None:
+            probabilities = [None] * len(labels)
+        else:
+            probabilities = probabilities.tolist()
+
+        rows = [
+            [song_id, model_key, label, probability]
+            for song_id, label, probability in zip(
+                song_ids.tolist(), labels.tolist(), probabilities
+            )
+        ]
+        db.insert_predictions_bulk(rows, cnx, cursor)
+        predicted += len(labels)
+
+    log.info(f"Predicted {predicted} tracks with model {model_key}")
+    return predicted
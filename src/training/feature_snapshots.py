@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import src.database.db_interface as db
+from dotenv import load_dotenv
+
+log = logging.getLogger("main")
+
+load_dotenv()
+
+SNAPSHOT_PATH = Path(os.getenv("DATA_PATH")) / "datasets" / "snapshots"
+
+# snapshots of other versions are taken again
+SNAPSHOT_VERSION = 2
+
+
+def db_fingerprint(db_name: str) -> str:
+    """Fingerprints the current state of a database by size and modification time
+    of its file and write-ahead log.
+
+    Args:
+        db_name (str): name of the database
+
+    Returns:
+        str: the fingerprint
+    """
+    db_path = db.get_db_path(db_name)
+    state = []
+
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            state.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+
+    return hashlib.sha1("\n".join(state).encode("utf-8")).hexdigest()
+
+
+def snapshot_dir(frame_name: str, query: str) -> Path:
+    """Returns the directory of the snapshot of a frame, which changes with the
+    query the frame is loaded with.
+
+    Args:
+        frame_name (str): name of the frame
+        query (str): query the frame is loaded with
+
+    Returns:
+        Path: directory of the snapshot
+    """
+    query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+    return SNAPSHOT_PATH / f"{frame_name}_{query_hash}"
+
+
+def encode_column(column: pd.Series) -> dict:
+    """Converts a column to a numpy array which can be stored in a .npy file.
+    Text columns are stored as integer codes of their categories, numeric
+    columns keep their dtype.
+
+    Args:
+        column (pd.Series): the column
+
+    Returns:
+        dict: values, kind, categories and dtype of the column
+    """
+    if not pd.api.types.is_numeric_dtype(column):
+        codes, categories = pd.factorize(column)
+        codes = pd.to_numeric(codes, downcast="integer")
+        return {
+            "values": codes,
+            "kind": "text",
+            "categories": list(categories),
+            "dtype": str(column.dtype),
+        }
+
+    return {
+        "values": column.to_numpy(),
+        "kind": "numeric",
+        "categories": None,
+        "dtype": str(column.dtype),
+    }
+
+
+def save_snapshot(df: pd.DataFrame, directory: Path, fingerprint: str):
+    """Stores every column of a frame in a .npy file and the column names and
+    categories in meta.json. The snapshot is written to a temporary directory
+    first, so readers never see a partial snapshot.
+
+    Args:
+        df (pd.DataFrame): the frame
+        directory (Path): directory of the snapshot
+        fingerprint (str): fingerprint of the database the frame was loaded from
+    """
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    columns = []
+
+    # columns are stored by position, since joined frames have duplicate names
+    for i in range(df.shape[1]):
+        column = encode_column(df.iloc[:, i])
+        np.save(tmp_dir / f"{i}.npy", column["values"], allow_pickle=False)
+        columns.append(
+            {
+                "name": df.columns[i],
+                "kind": column["kind"],
+                "categories": column["categories"],
+                "dtype": column["dtype"],
+            }
+        )
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": fingerprint,
+        "rows": len(df),
+        "columns": columns,
+    }
+    with open(tmp_dir / "meta.json", "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def load_snapshot(directory: Path, fingerprint: str) -> Optional[pd.DataFrame]:
+    """Loads a snapshot into a frame with the dtypes of the frame it was taken
+    from. Numeric columns are memory-mapped, the frame is built without copying
+    them on pandas >= 2, older versions copy them into blocks.
+
+    Args:
+        directory (Path): directory of the snapshot
+        fingerprint (str): fingerprint of the current state of the database
+
+    Returns:
+        Optional[pd.DataFrame]: the frame or None if there is no snapshot or it
+            has been taken from another state of the database
+    """
+    try:
+        with open(directory / "meta.json", "r", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("version") != SNAPSHOT_VERSION or meta["fingerprint"] != fingerprint:
+        return None
+
+    columns = {}
+    for i, column in enumerate(meta["columns"]):
+        values = np.load(directory / f"{i}.npy", mmap_mode="r")
+
+        if column["kind"] == "text":
+            # code -1 marks missing values and picks the trailing None
+            categories = np.array(column["categories"] + [None], dtype=object)
+            values = pd.Series(categories[values], dtype=column["dtype"])
+
+        columns[i] = values
+
+    df = pd.DataFrame(columns, index=pd.RangeIndex(meta["rows"]), copy=False)
+    df.columns = [column["name"] for column in meta["columns"]]
+    return df
+
+
+def read_frame(
+    frame_name: str, query: str, db_name: str = "spotify_ds", use_snapshot: bool = True
+) -> pd.DataFrame:
+    """Loads the result of a query into a frame. The result is stored as snapshot
+    and loaded from it until the database changes. Frames loaded from a snapshot
+    have the same dtypes as frames loaded from the database.
+
+    Args:
+        frame_name (str): name of the frame
+        query (str): the query
+        db_name (str, optional): name of the database. Defaults to "spotify_ds".
+        use_snapshot (bool, optional): False to always run the query.
+            Defaults to True.
+
+    Returns:
+        pd.DataFrame: the frame
+    """
+    # fingerprint before querying, a concurrent write invalidates the snapshot
+    fingerprint = db_fingerprint(db_name)
+    directory = snapshot_dir(frame_name, query)
+
+    if use_snapshot:
+        df = load_snapshot(directory, fingerprint)
+        if df is not None:
+            log.info(f"Loaded '{frame_name}' frame from snapshot {directory}")
+            return df
+
+    cnx, cursor = db.connect_to_db(db_name, read_only=True)
+    df = pd.read_sql_query(query, cnx)
+
+    if use_snapshot:
+        save_snapshot(df, directory, fingerprint)
+        log.info(f"Stored '{frame_name}' frame in snapshot {directory}")
+
+    return df
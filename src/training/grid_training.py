@@ -0,0 +1,317 @@
+import itertools
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from imblearn.under_sampling import RandomUnderSampler
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.tree import DecisionTreeClassifier
+from src.training.postprocessing import data_fingerprint, store_model_to_file
+from src.training.pre_training import (
+    binary_popularity_column,
+    encode_genre_column,
+    get_complete_df,
+    multiclass_popularity_column,
+)
+
+log = logging.getLogger("main")
+
+load_dotenv()
+
+RESULTS_PATH = Path(os.getenv("DATA_PATH")) / "models"
+
+# columns of the complete frame which are no features
+DROPPED_COLUMNS = [
+    "id",
+    "name",
+    "artist_id",
+    "generation",
+    "song_id",
+    "primary_artist_id",
+    "lyrics_skipped",
+    "lyrics_stored",
+]
+
+MODELS = {
+    "gaussian": GaussianNB(),
+    "knn": KNeighborsClassifier(n_neighbors=5),
+    "decision_tree": DecisionTreeClassifier(random_state=42),
+    "random_forest": RandomForestClassifier(n_estimators=250, random_state=42),
+    "mlp": MLPClassifier(random_state=42),
+}
+
+# columns of the feature matrix, as sliced in the ensemble notebook
+FEATURE_SETS = {
+    "music": slice(1, 15),
+    "lyrics": slice(15, 19),
+    "artist": slice(-3, None),
+    "all": slice(None),
+}
+
+LABEL_SCHEMES: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "binary": binary_popularity_column,
+    "multiclass": multiclass_popularity_column,
+}
+
+METRICS = ["accuracy", "f1", "recall", "precision"]
+
+
+def complete_features(
+    df_complete: pd.DataFrame, label_scheme: str, max_followers: float = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Builds the feature matrix and labels of the complete frame like the ensemble
+    notebook. Song and artist popularity are mapped by the label scheme.
+
+    Args:
+        df_complete (pd.DataFrame): the frame of get_complete_df
+        label_scheme (str): key of LABEL_SCHEMES
+        max_followers (float, optional): followers which are scaled to 100.
+            Defaults to the maximum of the frame.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (features, labels)
+    """
+    to_classes = LABEL_SCHEMES[label_scheme]
+    df = df_complete.drop(columns=DROPPED_COLUMNS)
+
+    # the last columns are followers, artist popularity and genre
+    if max_followers is None:
+        max_followers = df["followers"].max()
+    df["followers"] = df["followers"] / (max_followers / 100)
+
+    features = np.column_stack(
+        [
+            df.iloc[:, 1:-2].to_numpy(dtype=np.float64),
+            to_classes(df.iloc[:, -2]).to_numpy(dtype=np.float64),
+            encode_genre_column(df.iloc[:, -1]).to_numpy(dtype=np.float64),
+        ]
+    )
+    labels = to_classes(df.iloc[:, 0]).to_numpy()
+
+    return features, labels
+
+
+def build_features(
+    df_complete: pd.DataFrame, label_scheme: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Builds the feature matrix and labels of the complete frame with the classes
+    balanced by undersampling.
+
+    Args:
+        df_complete (pd.DataFrame): the frame of get_complete_df
+        label_scheme (str): key of LABEL_SCHEMES
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (features, labels)
+    """
+    features, labels = complete_features(df_complete, label_scheme)
+    return RandomUnderSampler(random_state=42).fit_resample(features, labels)
+
+
+def run_fold(
+    features_path: Path,
+    labels_path: Path,
+    model_name: str,
+    feature_set: str,
+    train_index: np.ndarray,
+    test_index: np.ndarray,
+) -> dict:
+    """Fits a model on the training rows of a fold and scores it on the test rows.
+    The feature matrix is memory-mapped, so the workers share its pages instead
+    of receiving a copy.
+
+    Args:
+        features_path (Path): .npy file of the feature matrix
+        labels_path (Path): .npy file of the labels
+        model_name (str): key of MODELS
+        feature_set (str): key of FEATURE_SETS
+        train_index (np.ndarray): rows to fit on
+        test_index (np.ndarray): rows to score on
+
+    Returns:
+        dict: the metrics and timings of the fold
+    """
+    features = np.load(features_path, mmap_mode="r")
+    labels = np.load(labels_path, mmap_mode="r")
+    columns = FEATURE_SETS[feature_set]
+
+    model = clone(MODELS[model_name])
+
+    # the grid already uses every core of the budget
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)
+
+    start = time.perf_counter()
+    model.fit(features[train_index, columns], labels[train_index])
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_true = labels[test_index]
+    y_pred = model.predict(features[test_index, columns])
+    predict_time = time.perf_counter() - start
+
+    return {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "f1": f1_score(y_true, y_pred, average="weighted"),
+        "recall": recall_score(y_true, y_pred, average="weighted", zero_division=0),
+        "precision": precision_score(
+            y_true, y_pred, average="weighted", zero_division=0
+        ),
+        "fit_time": fit_time,
+        "predict_time": predict_time,
+    }
+
+
+def train_model(
+    model_name: str,
+    feature_set: str = "all",
+    label_scheme: str = "binary",
+    name: str = None,
+    model_type: str = "grid",
+) -> str:
+    """Fits a model of the grid on the balanced complete frame and stores it with
+    the feature set, label scheme and follower scaling, which batch_scoring and
+    the prediction server build the features of the tracks with.
+
+    Args:
+        model_name (str): key of MODELS
+        feature_set (str, optional): key of FEATURE_SETS. Defaults to "all".
+        label_scheme (str, optional): key of LABEL_SCHEMES. Defaults to "binary".
+        name (str, optional): name of the stored model.
+            Defaults to "<model_name>_<feature_set>_<label_scheme>".
+        model_type (str, optional): name of parent folder of the model.
+            Defaults to "grid".
+
+    Returns:
+        str: name of the stored model
+    """
+    df_complete = get_complete_df()
+
+    # complete_features scales the followers by the maximum of the frame
+    max_followers = float(df_complete["followers"].max())
+    features, labels = build_features(df_complete, label_scheme)
+    features = features[:, FEATURE_SETS[feature_set]]
+
+    model = clone(MODELS[model_name]).fit(features, labels)
+    name = name or f"{model_name}_{feature_set}_{label_scheme}"
+
+    store_model_to_file(
+        model,
+        name,
+        model_type,
+        features=feature_set,
+        label_scheme=label_scheme,
+        fingerprint=data_fingerprint(features, labels),
+        max_followers=max_followers,
+    )
+    log.info(f"Stored model {model_type}/{name} fitted on {len(labels)} samples")
+
+    return name
+
+
+def train_grid(
+    n_jobs: int = os.cpu_count(),
+    folds: int = 5,
+    models: List[str] = None,
+    feature_sets: List[str] = None,
+    label_schemes: List[str] = None,
+) -> pd.DataFrame:
+    """Cross-validates every combination of model, feature set and label scheme.
+    The folds of all combinations run in a pool of n_jobs processes. The mean
+    and standard deviation of the metrics are written to a csv file in the
+    models directory.
+
+    Args:
+        n_jobs (int, optional): number of worker processes.
+            Defaults to os.cpu_count().
+        folds (int, optional): number of stratified folds. Defaults to 5.
+        models (List[str], optional): keys of MODELS. Defaults to all.
+        feature_sets (List[str], optional): keys of FEATURE_SETS. Defaults to all.
+        label_schemes (List[str], optional): keys of LABEL_SCHEMES.
+            Defaults to all.
+
+    Returns:
+        pd.DataFrame: the results table
+    """
+    models = models or list(MODELS)
+    feature_sets = feature_sets or list(FEATURE_SETS)
+    label_schemes = label_schemes or list(LABEL_SCHEMES)
+
+    df_complete = get_complete_df()
+    keys = []
+    jobs = []
+
+    with tempfile.TemporaryDirectory(prefix="grid_training_") as tmp_dir:
+        for label_scheme in label_schemes:
+            features, labels = build_features(df_complete, label_scheme)
+            features_path = Path(tmp_dir) / f"features_{label_scheme}.npy"
+            labels_path = Path(tmp_dir) / f"labels_{label_scheme}.npy"
+            np.save(features_path, features)
+            np.save(labels_path, labels)
+
+            log.info(
+                f"Stored {features.shape[0]} samples of label scheme '{label_scheme}'"
+            )
+
+            splits = list(
+                StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(
+                    features, labels
+                )
+            )
+
+            for model_name, feature_set in itertools.product(models, feature_sets):
+                for fold, (train_index, test_index) in enumerate(splits):
+                    keys.append((model_name, feature_set, label_scheme, fold))
+                    jobs.append(
+                        delayed(run_fold)(
+                            features_path,
+                            labels_path,
+                            model_name,
+                            feature_set,
+                            train_index,
+                            test_index,
+                        )
+                    )
+
+        log.info(f"Running {len(jobs)} jobs in {n_jobs} processes")
+        start = time.perf_counter()
+        fold_results = Parallel(n_jobs=n_jobs, backend="loky", verbose=5)(jobs)
+        log.info(f"Finished grid in {time.perf_counter() - start:.1f} s")
+
+    index = pd.MultiIndex.from_tuples(
+        keys, names=["model", "feature_set", "label_scheme", "fold"]
+    )
+    fold_df = pd.DataFrame(fold_results, index=index)
+
+    results = fold_df.groupby(level=["model", "feature_set", "label_scheme"]).agg(
+        {
+            **{metric: ["mean", "std"] for metric in METRICS},
+            "fit_time": ["sum"],
+            "predict_time": ["sum"],
+        }
+    )
+    results.columns = ["_".join(column) for column in results.columns]
+    results = results.sort_values("f1_mean", ascending=False)
+
+    RESULTS_PATH.mkdir(parents=True, exist_ok=True)
+    results_file = RESULTS_PATH / "grid_results_{:%Y-%m-%d_%H-%M-%S}.csv".format(
+        datetime.now()
+    )
+    results.to_csv(results_file)
+    log.info(f"Stored results of {len(results)} combinations in {results_file}")
+
+    return results
@@ -7,14 +7,17 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from matplotlib import axes
-from sklearn.metrics._plot.confusion_matrix import plot_confusion_matrix
+from sklearn.metrics import ConfusionMatrixDisplay
 
-from .postprocessing import get_metrics
+from .postprocessing import ModelEvaluation
 
 load_dotenv()
 
 DATA_PATH = os.getenv("DATA_PATH")
 
+# plot functions which draw on the axis passed as "ax" argument
+AXIS_PLOTS = ["plot_confusion_matrix", "plot_evaluation_confusion_matrix"]
+
 
 def disp_scatter(
     x: any,
@@ -98,7 +101,7 @@ def plots_from_list(
         # for confusion matrix, add axis to arguments
         fun = plot_data[0]
 
-        if fun != "text" and fun.__name__ == "plot_confusion_matrix":
+        if fun != "text" and fun.__name__ in AXIS_PLOTS:
             plot_data[1]["ax"] = ax
 
         if fun == "text":
@@ -120,6 +123,40 @@ def plots_from_list(
         plt.show()
 
 
+def plot_evaluation_confusion_matrix(
+    evaluation: ModelEvaluation,
+    normalize: str = None,
+    ax: axes.Axes = None,
+    cmap: Any = plt.cm.Blues,
+    values_format: str = ".2f",
+):
+    """Plots the confusion matrix of the cached predictions of an evaluation.
+
+    Args:
+        evaluation (ModelEvaluation): the evaluation of a classifier
+        normalize (str, optional): None, "true", "pred" or "all". Defaults to None.
+        ax (axes.Axes, optional): axis to plot on. Defaults to None.
+        cmap (Any, optional): colormap of the matrix. Defaults to plt.cm.Blues.
+        values_format (str, optional): format of the values. Defaults to ".2f".
+    """
+    # from_predictions was added in scikit-learn 1.0
+    if hasattr(ConfusionMatrixDisplay, "from_predictions"):
+        ConfusionMatrixDisplay.from_predictions(
+            evaluation.y_true,
+            evaluation.y_pred,
+            labels=evaluation.labels,
+            normalize=normalize,
+            ax=ax,
+            cmap=cmap,
+            values_format=values_format,
+        )
+    else:
+        ConfusionMatrixDisplay(
+            evaluation.get_confusion_matrix(normalize),
+            display_labels=evaluation.labels,
+        ).plot(ax=ax, cmap=cmap, values_format=values_format)
+
+
 def generate_model_plots(
     X_test: List[any],
     y_test: List[any],
@@ -127,6 +164,7 @@ def generate_model_plots(
     clf_annotations: List[str] = None,
 ):
     """Generates a list confusion matrices for the classifiers in `clf_list`.
+    Every classifier predicts the test data only once.
 
     Args:
         X_test (List[any]): test data samples
@@ -138,61 +176,48 @@ def generate_model_plots(
         List[Tuple[Callable, Dict[str, Any]]: list of plots
     """
 
-    # metrics
-    metrics_list = list(map(lambda clf: (get_metrics(clf, X_test, y_test)), clf_list))
+    # predictions
+    evaluations = list(map(lambda clf: ModelEvaluation(clf, X_test, y_test), clf_list))
 
+    # metrics
     text_plots = list(
         map(
-            lambda txt: (
+            lambda evaluation: (
                 "text",
-                {"x": 0.05, "y": 0.4, "s": txt, "wrap": True},
+                {"x": 0.05, "y": 0.4, "s": evaluation.metrics(), "wrap": True},
                 None,
                 None,
                 None,
             ),
-            metrics_list,
+            evaluations,
         )
     )
 
     # confusion matrices
     cf_matrices = list(
         map(
-            lambda clf: (
-                plot_confusion_matrix,
-                {
-                    "estimator": clf,
-                    "X": X_test,
-                    "y_true": y_test,
-                    "cmap": plt.cm.Blues,
-                    "normalize": None,
-                    "values_format": ".2f",
-                },
-                str(clf),
+            lambda evaluation: (
+                plot_evaluation_confusion_matrix,
+                {"evaluation": evaluation, "normalize": None},
+                str(evaluation.clf),
                 None,
                 None,
             ),
-            clf_list,
+            evaluations,
         )
     )
 
     # normalized confusion matrices
     cf_matrices_norm = list(
         map(
-            lambda clf: (
-                plot_confusion_matrix,
-                {
-                    "estimator": clf,
-                    "X": X_test,
-                    "y_true": y_test,
-                    "cmap": plt.cm.Blues,
-                    "normalize": "true",
-                    "values_format": ".2f",
-                },
-                str(clf),
+            lambda evaluation: (
+                plot_evaluation_confusion_matrix,
+                {"evaluation": evaluation, "normalize": "true"},
+                str(evaluation.clf),
                 None,
                 None,
             ),
-            clf_list,
+            evaluations,
         )
     )
 
@@ -1,63 +1,340 @@
+import hashlib
+import json
+import logging
 import os
 import pickle
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
+import joblib
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from sklearn import model_selection
-from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from sklearn.metrics import (
+    accuracy_score,
+    confusion_matrix,
+    f1_score,
+    precision_score,
+    recall_score,
+)
+
+log = logging.getLogger("main")
 
 load_dotenv()
 DATA_PATH = os.getenv("DATA_PATH")
 
+MODEL_SUFFIX = ".joblib"
+MANIFEST_SUFFIX = ".json"
+LEGACY_SUFFIX = ".mdl"
 
-def store_model_to_file(model, model_name: str, model_type: str):
 
-    model_dir = Path(DATA_PATH) / "models" / model_type
+def model_path(model_name: str, model_type: str, suffix: str) -> Path:
+    # path of a file of a stored model
+    return Path(DATA_PATH) / "models" / model_type / (model_name + suffix)
 
-    if not model_dir.is_dir():
-        model_dir.mkdir(parents=True, exist_ok=True)
 
-    pickle.dump(model, open(model_dir / (model_name + ".mdl"), "wb"))
+def data_fingerprint(X, y) -> str:
+    """Fingerprints the training data of a model by its values.
 
+    Args:
+        X: training data samples
+        y: training data classes
 
-def load_model(model_name: str, model_type: str):
+    Returns:
+        str: the fingerprint
+    """
+    data_hash = hashlib.sha1()
+    for values in (X, y):
+        data_hash.update(np.ascontiguousarray(values).tobytes())
 
-    model_dir = Path(DATA_PATH) / "models" / model_type
-    return pickle.load(open(model_dir / (model_name + ".mdl"), "rb"))
+    return data_hash.hexdigest()
 
 
-def get_metrics(clf, X_test, y_test):
-    # predict on test set
-    y_predict = clf.predict(X_test)
-    metrics = ""
+def read_manifest(model_name: str, model_type: str) -> Optional[dict]:
+    """Reads the manifest of a stored model.
 
-    # print metrics
-    metrics += (
-        "Weighted accuracy: " + str(round(accuracy_score(y_test, y_predict), 4)) + "\n"
-    )
-    metrics += (
-        "Weighted f1: "
-        + str(round(f1_score(y_test, y_predict, average="weighted"), 4))
-        + "\n"
-    )
-    metrics += (
-        "Weighted recall: "
-        + str(round(recall_score(y_test, y_predict, average="weighted"), 4))
-        + "\n"
-    )
-    metrics += (
-        "Weighted precision: "
-        + str(round(precision_score(y_test, y_predict, average="weighted"), 4))
-        + "\n"
+    Args:
+        model_name (str): name of the model
+        model_type (str): name of parent folder of the model
+
+    Returns:
+        Optional[dict]: the manifest or None if the model has none
+    """
+    try:
+        with open(
+            model_path(model_name, model_type, MANIFEST_SUFFIX), encoding="utf-8"
+        ) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(manifest: dict):
+    # the manifest is replaced at once, so readers never see a partial file
+    path = model_path(manifest["name"], manifest["type"], MANIFEST_SUFFIX)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+
+    os.replace(tmp_path, path)
+
+
+def store_model_to_file(
+    model,
+    model_name: str,
+    model_type: str,
+    compress: int = 3,
+    features: str = None,
+    label_scheme: str = None,
+    fingerprint: str = None,
+    max_followers: float = None,
+):
+    """Stores a model with joblib and its metadata in a manifest next to it.
+
+    Args:
+        model: the model
+        model_name (str): name of the model
+        model_type (str): name of parent folder of the model
+        compress (int, optional): zlib compression level from 0 to 9.
+            Defaults to 3.
+        features (str, optional): feature set the model is trained on, e.g.
+            "music". Defaults to None.
+        label_scheme (str, optional): labeling of the classes, e.g. "binary".
+            Defaults to None.
+        fingerprint (str, optional): fingerprint of the training data, see
+            data_fingerprint. Defaults to None.
+        max_followers (float, optional): followers scaled to 100 in the training
+            data, see complete_features. Defaults to None.
+    """
+    path = model_path(model_name, model_type, MODEL_SUFFIX)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    joblib.dump(model, path, compress=compress)
+    store_time = time.perf_counter() - start
+
+    write_manifest(
+        {
+            "name": model_name,
+            "type": model_type,
+            "model": type(model).__name__,
+            "compress": compress,
+            "features": features,
+            "label_scheme": label_scheme,
+            "fingerprint": fingerprint,
+            "max_followers": max_followers,
+            "size": path.stat().st_size,
+            "stored_at": time.time(),
+            "store_time": store_time,
+            "loaded_at": None,
+            "load_time": None,
+        }
     )
 
-    # check which labels do not appear in prediction
-    metrics += f"Contained classes in prediction: {set(y_predict)}" + "\n"
-    metrics += f"Contained classes in test: {set(y_test)}"
-    return metrics
+
+def load_model(model_name: str, model_type: str, mmap_mode: Optional[str] = None):
+    """Loads a stored model. Models stored by previous versions as pickled .mdl
+    files are loaded if there is no joblib file.
+
+    Args:
+        model_name (str): name of the model
+        model_type (str): name of parent folder of the model
+        mmap_mode (Optional[str], optional): mode to map the plain numpy arrays of
+            uncompressed models into memory, e.g. the samples of knn. The trees
+            of forests are copied when unpickled either way. Defaults to None.
+
+    Returns:
+        the model
+    """
+    path = model_path(model_name, model_type, MODEL_SUFFIX)
+
+    if not path.is_file():
+        with open(model_path(model_name, model_type, LEGACY_SUFFIX), "rb") as file:
+            return pickle.load(file)
+
+    manifest = read_manifest(model_name, model_type)
+
+    # compressed models can not be mapped into memory
+    if manifest is not None and manifest["compress"]:
+        mmap_mode = None
+
+    start = time.perf_counter()
+    model = joblib.load(path, mmap_mode=mmap_mode)
+    load_time = time.perf_counter() - start
+
+    # the load time orders the models for eviction, it must not fail the load
+    if manifest is not None:
+        manifest["loaded_at"] = time.time()
+        manifest["load_time"] = load_time
+        try:
+            write_manifest(manifest)
+        except OSError as err:
+            log.warning(f"Failed recording load of model {model_name}: {err}")
+
+    return model
+
+
+def list_models(model_type: str = None) -> List[dict]:
+    """Lists the stored models with their manifests. Legacy .mdl models are
+    listed with their size and modification time only.
+
+    Args:
+        model_type (str, optional): name of parent folder of the models, None for
+            all folders. Defaults to None.
+
+    Returns:
+        List[dict]: the manifests, least recently used first
+    """
+    models_dir = Path(DATA_PATH) / "models"
+    pattern = f"{model_type}/*" if model_type else "*/*"
+    models = []
+
+    for path in models_dir.glob(pattern):
+        if path.suffix == MODEL_SUFFIX:
+            manifest = read_manifest(path.stem, path.parent.name)
+        elif path.suffix == LEGACY_SUFFIX:
+            manifest = None
+        else:
+            continue
+
+        if manifest is None:
+            stat = path.stat()
+            manifest = {
+                "name": path.stem,
+                "type": path.parent.name,
+                "size": stat.st_size,
+                "stored_at": stat.st_mtime,
+                "loaded_at": None,
+            }
+
+        manifest["path"] = str(path)
+        models.append(manifest)
+
+    return sorted(models, key=lambda m: m["loaded_at"] or m["stored_at"])
+
+
+def evict_models(max_size: int, model_type: str = None) -> List[dict]:
+    """Deletes the least recently used models until the stored models fit into
+    the size budget.
+
+    Args:
+        max_size (int): size budget in bytes
+        model_type (str, optional): name of parent folder of the models, None for
+            all folders. Defaults to None.
+
+    Returns:
+        List[dict]: manifests of the deleted models
+    """
+    models = list_models(model_type)
+    size = sum(m["size"] for m in models)
+    evicted = []
+
+    for manifest in models:
+        if size <= max_size:
+            break
+
+        Path(manifest["path"]).unlink()
+        model_path(manifest["name"], manifest["type"], MANIFEST_SUFFIX).unlink(
+            missing_ok=True
+        )
+        size -= manifest["size"]
+        evicted.append(manifest)
+
+    return evicted
+
+
+class ModelEvaluation:
+    """Predicts the test set once with a classifier and derives the metrics and
+    confusion matrices from the cached predictions.
+    """
+
+    def __init__(self, clf, X_test, y_test):
+        """Predicts the test set.
+
+        Args:
+            clf: the fitted classifier
+            X_test: test data samples
+            y_test: test data classes
+        """
+        self.clf = clf
+        self.X_test = X_test
+        self.y_true = np.asarray(y_test)
+        self.y_pred = clf.predict(X_test)
+        self.labels = np.unique(np.concatenate([self.y_true, self.y_pred]))
+        self._proba = None
+
+        self.accuracy = accuracy_score(self.y_true, self.y_pred)
+        self.f1 = f1_score(self.y_true, self.y_pred, average="weighted")
+        self.recall = recall_score(self.y_true, self.y_pred, average="weighted")
+        self.precision = precision_score(self.y_true, self.y_pred, average="weighted")
+        self.matrix = confusion_matrix(self.y_true, self.y_pred, labels=self.labels)
+
+    @property
+    def proba(self) -> np.ndarray:
+        """Class probabilities of the test set, predicted on first access.
+
+        Returns:
+            np.ndarray: the probabilities or None if the classifier has none
+        """
+        if self._proba is None and hasattr(self.clf, "predict_proba"):
+            try:
+                self._proba = self.clf.predict_proba(self.X_test)
+            except AttributeError:
+                # e.g. SVC without probability=True
+                pass
+
+        return self._proba
+
+    def get_confusion_matrix(self, normalize: str = None) -> np.ndarray:
+        """Returns the confusion matrix of the predictions.
+
+        Args:
+            normalize (str, optional): None, "true", "pred" or "all", like
+                sklearn's confusion_matrix. Defaults to None.
+
+        Returns:
+            np.ndarray: the confusion matrix
+        """
+        matrix = self.matrix.astype(np.float64)
+
+        with np.errstate(all="ignore"):
+            if normalize == "true":
+                matrix = matrix / matrix.sum(axis=1, keepdims=True)
+            elif normalize == "pred":
+                matrix = matrix / matrix.sum(axis=0, keepdims=True)
+            elif normalize == "all":
+                matrix = matrix / matrix.sum()
+
+        return np.nan_to_num(matrix)
+
+    def metrics(self) -> str:
+        """Returns the metrics of the predictions as text.
+
+        Returns:
+            str: the metrics
+        """
+        metrics = ""
+
+        # print metrics
+        metrics += "Weighted accuracy: " + str(round(self.accuracy, 4)) + "\n"
+        metrics += "Weighted f1: " + str(round(self.f1, 4)) + "\n"
+        metrics += "Weighted recall: " + str(round(self.recall, 4)) + "\n"
+        metrics += "Weighted precision: " + str(round(self.precision, 4)) + "\n"
+
+        # check which labels do not appear in prediction
+        metrics += (
+            f"Contained classes in prediction: {set(self.y_pred.tolist())}" + "\n"
+        )
+        metrics += f"Contained classes in test: {set(self.y_true.tolist())}"
+        return metrics
+
+
+def get_metrics(clf, X_test, y_test):
+    return ModelEvaluation(clf, X_test, y_test).metrics()
 
 
 def print_metrics(clf, X_test, y_test):
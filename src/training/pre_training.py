@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-import src.database.db_interface as db
+from src.training.feature_snapshots import read_frame
 
 meta_genres = dict(
     enumerate(
@@ -27,14 +28,12 @@ meta_genres = dict(
 )
 
 
-def get_artist_df():
+def get_artist_df(use_snapshot: bool = True):
     """Loads the artist features from the database into a dataframe
 
     Returns:
         dataframe: the pd dataframe of the artist features
     """
-    cnx, cursor = db.connect_to_db("spotify_ds")
-
     query = """
         SELECT DISTINCT ag.genre_name, a.followers, a.popularity
         FROM artists AS a
@@ -45,35 +44,31 @@ def get_artist_df():
         GROUP BY a.id;
     """
 
-    return pd.read_sql_query(query, cnx)
+    return read_frame("artist", query, use_snapshot=use_snapshot)
 
 
-def get_lyric_df():
+def get_lyric_df(use_snapshot: bool = True):
     """Loads the lyrical features from the database into a dataframe.
 
     Returns:
         dataframe: the pd dataframe of the lyrical features
     """
-    cnx, cursor = db.connect_to_db("spotify_ds")
-
     query = """
         SELECT DISTINCT ls.word_count, ls.diversity, ls.repetition, t.popularity
         FROM lyric_scores AS ls
         INNER JOIN tracks AS t on t.id = ls.song_id;
     """
 
-    return pd.read_sql_query(query, cnx)
+    return read_frame("lyric", query, use_snapshot=use_snapshot)
 
 
 # get music df
-def get_music_df():
+def get_music_df(use_snapshot: bool = True):
     """Loads the musical features from the database into a dataframe
 
     Returns:
         dataframe: the pd dataframe of the musical features
     """
-    cnx, cursor = db.connect_to_db("spotify_ds")
-
     query = """
         SELECT DISTINCT t.duration_ms, t.explict, t.release_year, t.danceability, t.energy, t.key, t.loadness, t.mode, t.speechiness, t.acousticness, t.instrumentalness, t.liveness, t.valence, t.tempo, t.time_signature, t.popularity
         FROM tracks AS t
@@ -84,17 +79,15 @@ def get_music_df():
         AND t.release_year >= 2000;
     """
 
-    return pd.read_sql_query(query, cnx)
+    return read_frame("music", query, use_snapshot=use_snapshot)
 
 
-def get_complete_df():
+def get_complete_df(use_snapshot: bool = True):
     """Loads data from the database into a dataframe
 
     Returns:
         dataframe: the pd dataframe of the musical features
     """
-    cnx, cursor = db.connect_to_db("spotify_ds")
-
     query = """
         SELECT DISTINCT *
         FROM tracks t
@@ -108,7 +101,7 @@ def get_complete_df():
         GROUP BY t.id;
     """
 
-    return pd.read_sql_query(query, cnx)
+    return read_frame("complete", query, use_snapshot=use_snapshot)
 
 
 def encode_genre(genre: str) -> int:
@@ -146,3 +139,24 @@ def binary_popularity(x: int) -> int:
 def scale_popularity(x: int) -> int:
     # scale popularity from [0-100] to [0-10]
     return int(x / 10)
+
+
+def encode_genre_column(genres: pd.Series) -> pd.Series:
+    # encode a column of genres as int, every distinct genre is encoded only once
+    genre_codes = {g: encode_genre(g) for g in genres.dropna().unique()}
+    return genres.map(genre_codes)
+
+
+def multiclass_popularity_column(x: pd.Series) -> pd.Series:
+    # map a column of popularities to the classes of multiclass_popularity
+    return pd.Series(np.digitize(x, [20, 40, 60, 80]) + 1, index=x.index)
+
+
+def binary_popularity_column(x: pd.Series) -> pd.Series:
+    # map a column of popularities to the classes of binary_popularity
+    return (x >= 50).astype(int)
+
+
+def scale_popularity_column(x: pd.Series) -> pd.Series:
+    # scale a column of popularities like scale_popularity
+    return np.trunc(x / 10).astype(int)
@@ -0,0 +1,361 @@
+import collections
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from src.training.batch_scoring import iter_db_features, model_features, predict_chunk
+from src.training.grid_training import FEATURE_SETS
+from src.training.postprocessing import load_model
+
+log = logging.getLogger("main")
+
+# number of recent requests the latency percentiles are computed from
+LATENCY_WINDOW = 10000
+
+
+class FeatureCache:
+    """Features of every track with lyric scores, joined once at startup and kept
+    in memory by label scheme and scaling of the followers.
+    """
+
+    def __init__(self, db_name: str, chunk_size: int = 50000):
+        """Creates an empty cache.
+
+        Args:
+            db_name (str): name of the database
+            chunk_size (int, optional): tracks per chunk while loading.
+                Defaults to 50000.
+        """
+        self.db_name = db_name
+        self.chunk_size = chunk_size
+        self.rows: Dict[Tuple[str, Optional[float]], Dict[str, int]] = {}
+        self.features: Dict[Tuple[str, Optional[float]], np.ndarray] = {}
+        self.lock = threading.Lock()
+
+    def load(self, label_scheme: str, max_followers: float = None):
+        """Loads the features of a label scheme if they are not cached yet.
+
+        Args:
+            label_scheme (str): label scheme of the features
+            max_followers (float, optional): followers scaled to 100, see
+                iter_db_features. Defaults to the maximum of the database.
+        """
+        key = (label_scheme, max_followers)
+
+        with self.lock:
+            if key in self.features:
+                return
+
+            song_ids = []
+            features = []
+
+            for chunk_ids, chunk_features in iter_db_features(
+                self.db_name, label_scheme, "all", self.chunk_size, max_followers
+            ):
+                song_ids.extend(chunk_ids.tolist())
+                features.append(chunk_features)
+
+            if len(song_ids) == 0:
+                log.warning(f"No tracks with lyric scores to cache for {key}")
+
+            self.rows[key] = {s: i for i, s in enumerate(song_ids)}
+            self.features[key] = np.concatenate(features)
+            log.info(f"Cached features of {len(song_ids)} tracks for {key}")
+
+    def get(
+        self, song_id: str, label_scheme: str, max_followers: float = None
+    ) -> np.ndarray:
+        """Returns all features of a track.
+
+        Args:
+            song_id (str): id of the track
+            label_scheme (str): label scheme of the features
+            max_followers (float, optional): followers scaled to 100.
+                Defaults to the maximum of the database.
+
+        Raises:
+            KeyError: the track has no features
+
+        Returns:
+            np.ndarray: the features
+        """
+        key = (label_scheme, max_followers)
+        return self.features[key][self.rows[key][song_id]]
+
+
+class MicroBatcher:
+    """Collects concurrent predictions of a model into batches. A batch is
+    predicted once it holds max_batch requests or its first request has waited
+    max_wait seconds.
+    """
+
+    def __init__(self, model, max_batch: int = 64, max_wait: float = 0.005):
+        """Starts the thread predicting the batches.
+
+        Args:
+            model: the classifier
+            max_batch (int, optional): maximum requests per batch. Defaults to 64.
+            max_wait (float, optional): seconds the first request of a batch waits
+                for more requests. Defaults to 0.005.
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_sizes = collections.deque(maxlen=LATENCY_WINDOW)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, features: np.ndarray) -> Future:
+        """Queues the features of a track for prediction.
+
+        Args:
+            features (np.ndarray): the features
+
+        Returns:
+            Future: resolves to (label, probability)
+        """
+        future = Future()
+        self.requests.put((features, future))
+        return future
+
+    def next_batch(self) -> List[Tuple[np.ndarray, Future]]:
+        # blocks for the first request, then collects until the batch is full
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def run(self):
+        """Predicts the batches of the queue, runs in the thread of the batcher."""
+        while True:
+            batch = self.next_batch()
+            self.batch_sizes.append(len(batch))
+
+            try:
+                labels, probabilities = predict_chunk(
+                    self.model, np.stack([features for features, _ in batch])
+                )
+            except Exception as err:
+                for _, future in batch:
+                    future.set_exception(err)
+                continue
+
+            for i, (_, future) in enumerate(batch):
+                probability = None if probabilities is None else probabilities[i]
+                future.set_result((labels[i].item(), probability))
+
+
+class PredictionService:
+    """Keeps models, their features and micro-batchers in memory and records the
+    latency of the predictions.
+    """
+
+    def __init__(
+        self,
+        models: List[Tuple[str, str]],
+        db_name: str = "spotify_ds",
+        max_batch: int = 64,
+        max_wait: float = 0.005,
+    ):
+        """Loads the models and the features they need.
+
+        Args:
+            models (List[Tuple[str, str]]): (model_name, model_type) of the models
+            db_name (str, optional): name of the database. Defaults to "spotify_ds".
+            max_batch (int, optional): maximum requests per batch. Defaults to 64.
+            max_wait (float, optional): seconds a batch waits for more requests.
+                Defaults to 0.005.
+
+        Raises:
+            ValueError: the manifest of a model does not record its features
+        """
+        self.cache = FeatureCache(db_name)
+        self.models = {}
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+        for model_name, model_type in models:
+            feature_set, label_scheme, max_followers = model_features(
+                model_name, model_type
+            )
+
+            model = load_model(model_name, model_type)
+            self.cache.load(label_scheme, max_followers)
+
+            self.models[f"{model_type}/{model_name}"] = {
+                "batcher": MicroBatcher(model, max_batch, max_wait),
+                "label_scheme": label_scheme,
+                "max_followers": max_followers,
+                "columns": FEATURE_SETS[feature_set],
+            }
+            log.info(f"Serving model {model_type}/{model_name}")
+
+    def predict(self, model_key: str, song_id: str, timeout: float = 10.0) -> dict:
+        """Predicts the popularity of a track.
+
+        Args:
+            model_key (str): "model_type/model_name" of a served model
+            song_id (str): id of the track
+            timeout (float, optional): seconds to wait for the prediction.
+                Defaults to 10.0.
+
+        Raises:
+            KeyError: unknown model or track
+
+        Returns:
+            dict: the prediction
+        """
+        start = time.perf_counter()
+
+        try:
+            model = self.models[model_key]
+            features = self.cache.get(
+                song_id, model["label_scheme"], model["max_followers"]
+            )
+            future = model["batcher"].submit(features[model["columns"]])
+            label, probability = future.result(timeout=timeout)
+        except Exception:
+            self.count_error()
+            raise
+
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(time.perf_counter() - start)
+
+        return {
+            "song_id": song_id,
+            "model": model_key,
+            "label": label,
+            "probability": probability,
+        }
+
+    def count_error(self):
+        """Counts a failed request, e.g. one which was rejected before predicting."""
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+
+    def metrics(self) -> dict:
+        """Returns the number of requests and the percentiles of the latency in
+        milliseconds and of the batch sizes of the recent requests.
+
+        Returns:
+            dict: the metrics
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            metrics = {"requests": self.requests, "errors": self.errors}
+
+        if len(latencies) > 0:
+            metrics["latency_p50_ms"] = float(np.percentile(latencies, 50))
+            metrics["latency_p99_ms"] = float(np.percentile(latencies, 99))
+
+        for model_key, model in self.models.items():
+            batch_sizes = list(model["batcher"].batch_sizes)
+            if batch_sizes:
+                metrics[f"{model_key} mean_batch_size"] = float(np.mean(batch_sizes))
+
+        return metrics
+
+
+def create_handler(service: PredictionService) -> type:
+    """Creates the request handler class of a service.
+
+    GET /predict?model=<model_type>/<model_name>&song_id=<id> returns a prediction,
+    GET /metrics returns the metrics of the service.
+
+    Args:
+        service (PredictionService): the service
+
+    Returns:
+        type: the request handler class
+    """
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+            if url.path == "/metrics":
+                self.send_json(200, service.metrics())
+            elif url.path == "/predict":
+                missing = [key for key in ("model", "song_id") if key not in params]
+                if missing:
+                    service.count_error()
+                    self.send_json(400, {"error": f"Missing parameters {missing}"})
+                    return
+
+                try:
+                    prediction = service.predict(params["model"], params["song_id"])
+                except KeyError as err:
+                    self.send_json(404, {"error": f"Unknown model or track {err}"})
+                except Exception as err:
+                    log.error(f"Failed predicting {params}: {err}")
+                    self.send_json(500, {"error": str(err)})
+                else:
+                    self.send_json(200, prediction)
+            else:
+                self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+        def log_message(self, format: str, *args):
+            log.debug(format % args)
+
+    return PredictionHandler
+
+
+def serve_predictions(
+    models: List[Tuple[str, str]],
+    port: int = 8000,
+    max_batch: int = 64,
+    max_wait: float = 0.005,
+    db_name: str = "spotify_ds",
+):
+    """Serves predictions of warm models over http until interrupted.
+
+    Args:
+        models (List[Tuple[str, str]]): (model_name, model_type) of the models
+        port (int, optional): port on localhost. Defaults to 8000.
+        max_batch (int, optional): maximum requests per batch. Defaults to 64.
+        max_wait (float, optional): seconds a batch waits for more requests.
+            Defaults to 0.005.
+        db_name (str, optional): name of the database. Defaults to "spotify_ds".
+    """
+    service = PredictionService(models, db_name, max_batch, max_wait)
+    server = ThreadingHTTPServer(("127.0.0.1", port), create_handler(service))
+    log.info(f"Serving predictions on http://127.0.0.1:{port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Stopped serving predictions")
+    finally:
+        server.server_close()